@@ -52,6 +52,10 @@ const char* password = "YOUR_WIFI_PASSWORD";
 const char* UPLOAD_ENDPOINT = "https://your-api-endpoint.com/api/upload-image";
 const char* API_KEY = "YOUR_API_KEY_HERE";
 
+// Send the raw JPEG frame buffer (Content-Type: image/jpeg) instead of a
+// base64 JSON body - avoids ~33% size inflation and a full-frame String copy
+const bool USE_BINARY_UPLOAD = true;
+
 // ==================== SYSTEM STATE ====================
 bool cameraReady = false;
 bool wifiConnected = false;
@@ -261,22 +265,33 @@ bool captureAndUploadImage(int frameNumber) {
     
     HTTPClient http;
     http.begin(UPLOAD_ENDPOINT);
-    http.addHeader("Content-Type", "application/json");
     http.addHeader("X-API-Key", API_KEY);
     
-    // Create JSON payload with base64 encoded image
-    String jsonPayload = "{";
-    jsonPayload += "\"frameNumber\":" + String(frameNumber) + ",";
-    jsonPayload += "\"timestamp\":" + String(millis()) + ",";
-    jsonPayload += "\"imageFormat\":\"jpeg\",";
-    jsonPayload += "\"imageSize\":" + String(fb->len) + ",";
-    
-    // Encode image to base64
-    String base64Image = base64::encode(fb->buf, fb->len);
-    jsonPayload += "\"imageData\":\"" + base64Image + "\"";
-    jsonPayload += "}";
-    
-    int httpCode = http.POST(jsonPayload);
+    int httpCode;
+    if (USE_BINARY_UPLOAD) {
+      // Metadata travels in headers, the body is the frame buffer itself
+      http.addHeader("Content-Type", "image/jpeg");
+      http.addHeader("X-Frame-Number", String(frameNumber));
+      http.addHeader("X-Timestamp", String(millis()));
+      http.addHeader("X-Image-Size", String(fb->len));
+      httpCode = http.POST(fb->buf, fb->len);
+    } else {
+      http.addHeader("Content-Type", "application/json");
+      
+      // Create JSON payload with base64 encoded image
+      String jsonPayload = "{";
+      jsonPayload += "\"frameNumber\":" + String(frameNumber) + ",";
+      jsonPayload += "\"timestamp\":" + String(millis()) + ",";
+      jsonPayload += "\"imageFormat\":\"jpeg\",";
+      jsonPayload += "\"imageSize\":" + String(fb->len) + ",";
+      
+      // Encode image to base64
+      String base64Image = base64::encode(fb->buf, fb->len);
+      jsonPayload += "\"imageData\":\"" + base64Image + "\"";
+      jsonPayload += "}";
+      
+      httpCode = http.POST(jsonPayload);
+    }
     
     if (httpCode > 0) {
       Serial.printf("[CLOUD] Upload successful (Code: %d)\n", httpCode);
@@ -6,16 +6,29 @@ Simulates ESP32 uploading image → YOLO Detection → Gemini Analysis → Fireb
 import os
 import json
 import time
+import threading
+import random
+import re
 import gradio as gr
 import firebase_admin
 from firebase_admin import credentials, db, storage
 from PIL import Image
 import io
 import base64
-from datetime import datetime
-from ultralytics import YOLO
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import datetime, timezone
 import google.generativeai as genai
 import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from burst import BurstAggregator
+from cache import LRUTTLCache
+from dedup import FrameDeduplicator, dhash
+from inference import load_model, merge_results, tile_windows
+from ingest import IngestQueue, create_ingest_router
+from stats import StatsAggregator, build_stats_update
+from tracing import Tracer
 
 # ============ CONFIGURATION ============
 FIREBASE_DB_URL = "https://gdg-wildfire-detection-mvp-default-rtdb.asia-southeast1.firebasedatabase.app"
@@ -33,103 +46,372 @@ DEFAULT_SENSORS = {
     "flame_detected": True
 }
 
+# Largest number of frames sent through YOLO in one forward pass
+# (the ESP32 firmware captures NUM_FRAMES = 5 per trigger)
+YOLO_MAX_BATCH = int(os.environ.get("YOLO_MAX_BATCH", "8"))
+
+# Inference backend: pytorch, onnx, onnx-int8, openvino or openvino-int8
+# (exported next to the weights on first use; see inference.py for a parity check)
+MODEL_WEIGHTS = os.environ.get("MODEL_WEIGHTS", "fire_n.pt")
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "pytorch")
+MODEL_IMGSZ = int(os.environ.get("MODEL_IMGSZ", "640"))
+MODEL_CALIBRATION_DATA = os.environ.get("MODEL_CALIBRATION_DATA")
+
+# Cascade: cheap low-resolution pass, tiled full-resolution re-check only for
+# frames whose best box falls in the uncertainty band
+CASCADE = os.environ.get("CASCADE", "1") == "1"
+CASCADE_LOW_IMGSZ = int(os.environ.get("CASCADE_LOW_IMGSZ", "320"))
+CASCADE_BAND = (
+    float(os.environ.get("CASCADE_BAND_LOW", "0.1")),
+    float(os.environ.get("CASCADE_BAND_HIGH", "0.5"))
+)
+CASCADE_TILE = int(os.environ.get("CASCADE_TILE", "640"))
+CASCADE_TILE_OVERLAP = 0.2
+CASCADE_NMS_IOU = 0.5
+DETECTION_CONFIDENCE = 0.25  # ultralytics' default box threshold
+
+# ESP32 ingest server (POST /api/upload-image)
+SERVER_PORT = int(os.environ.get("PORT", "7860"))
+INGEST_API_KEY = os.environ.get("INGEST_API_KEY", "")
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "32"))
+# Risk scheduling: riskier frames are served first (by up to INGEST_AGING seconds);
+# under overload low-risk frames are shed early and analyzed on a degraded path
+INGEST_AGING = float(os.environ.get("INGEST_AGING", "10"))
+INGEST_RESERVE = float(os.environ.get("INGEST_RESERVE", "0.25"))
+INGEST_DEGRADE_DEPTH = float(os.environ.get("INGEST_DEGRADE_DEPTH", "0.5"))
+SENSOR_RISK_MAX_POINTS = 8
+
+# Gemini assessment cache (LRU + TTL) keyed on quantized features
+GEMINI_CACHE_SIZE = int(os.environ.get("GEMINI_CACHE_SIZE", "256"))
+GEMINI_CACHE_TTL = float(os.environ.get("GEMINI_CACHE_TTL", "300"))
+GEMINI_CACHE_CONFIDENCE_STEP = 0.1   # confidence buckets
+GEMINI_CACHE_TEMPERATURE_STEP = 5.0  # °C
+GEMINI_CACHE_HUMIDITY_STEP = 10.0    # %
+GEMINI_CACHE_GAS_STEP = 100.0        # ppm
+
+# Local fast-path severity; Gemini enrichment runs in the background
+GEMINI_ASYNC = os.environ.get("GEMINI_ASYNC", "1") == "1"
+GEMINI_WORKERS = int(os.environ.get("GEMINI_WORKERS", "4"))
+GEMINI_UI_TIMEOUT = float(os.environ.get("GEMINI_UI_TIMEOUT", "15"))
+LOCAL_SEVERITY_THRESHOLDS = [(11, "CRITICAL"), (7, "HIGH"), (4, "MEDIUM")]
+LOCAL_SEVERITY_ACTIONS = {
+    "CRITICAL": "Dispatch fire response units immediately and alert nearby communities.",
+    "HIGH": "Dispatch emergency response team to the location now.",
+    "MEDIUM": "Dispatch a team for visual confirmation and assessment.",
+    "LOW": "Continue monitoring and review the captured images."
+}
+
+# Near-duplicate frame suppression (perceptual hash; -1 disables)
+PHASH_MAX_DISTANCE = int(os.environ.get("PHASH_MAX_DISTANCE", "4"))
+PHASH_HISTORY = int(os.environ.get("PHASH_HISTORY", "8"))
+PHASH_TTL = float(os.environ.get("PHASH_TTL", "60"))
+PHASH_WAIT_TIMEOUT = float(os.environ.get("PHASH_WAIT_TIMEOUT", "60"))
+
+# Burst fusion: the frames of one ESP32 trigger become a single incident (1 disables)
+BURST_SIZE = int(os.environ.get("BURST_SIZE", "5"))
+BURST_WINDOW = float(os.environ.get("BURST_WINDOW", "8"))
+
+# Independent pipeline stages (uploads, synchronous Gemini) run concurrently
+STAGE_WORKERS = int(os.environ.get("STAGE_WORKERS", "8"))
+STAGE_TIMEOUTS = {
+    "gemini": float(os.environ.get("GEMINI_TIMEOUT", "20")),
+    "upload_original": float(os.environ.get("UPLOAD_TIMEOUT", "20")),
+    "upload_annotated": float(os.environ.get("UPLOAD_TIMEOUT", "20"))
+}
+
+# Optional in-process stats aggregation (0 = write every incident directly)
+STATS_FLUSH_MS = int(os.environ.get("STATS_FLUSH_MS", "0"))
+STATS_FLUSH_COUNT = int(os.environ.get("STATS_FLUSH_COUNT", "50"))
+
+# Tracing: slow requests (ms, 0 = never) print their stage breakdown
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "5000"))
+TRACE_HISTORY = int(os.environ.get("TRACE_HISTORY", "100"))
+
+# Alphabet for locally generated Firebase push keys
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+# Downscaled image derivatives stored next to each full-size upload
+PREVIEW_MAX_SIDE = int(os.environ.get("PREVIEW_MAX_SIDE", "800"))
+THUMBNAIL_MAX_SIDE = int(os.environ.get("THUMBNAIL_MAX_SIDE", "240"))
+DERIVATIVE_QUALITY = int(os.environ.get("DERIVATIVE_QUALITY", "80"))
+
+# Geohash stored on each incident for bounding-box queries and map clustering
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+
 # ============ INITIALIZE SERVICES ============
+# Backends are created lazily on first use (thread-safe) so the server can bind
+# immediately; warm_up_services() loads everything in the background at startup.
+
+SERVICE_NAMES = ("firebase", "gemini", "model")
+service_status = {name: "pending" for name in SERVICE_NAMES}
+_services = {}
+_service_locks = {name: threading.Lock() for name in SERVICE_NAMES}
+
+
+def _get_service(name: str, factory):
+    """Create a backend once, even when several workers ask for it concurrently"""
+    if name in _services:
+        return _services[name]
+    
+    with _service_locks[name]:
+        if name not in _services:
+            service_status[name] = "loading"
+            try:
+                _services[name] = factory()
+            except Exception as e:
+                service_status[name] = f"error: {e}"
+                raise
+            if service_status[name] == "loading":
+                service_status[name] = "ready"
+    return _services[name]
+
+
+def _init_firebase() -> bool:
+    firebase_creds = json.loads(os.environ.get("FIREBASE_SERVICE_ACCOUNT", "{}"))
+    if not firebase_creds:
+        service_status["firebase"] = "not_configured"
+        return False
+    
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(firebase_creds)
+        firebase_admin.initialize_app(cred, {
+            "databaseURL": FIREBASE_DB_URL,
+            "storageBucket": FIREBASE_BUCKET
+        })
+    return True
+
+
+def _init_gemini():
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY", ""))
+    return genai.GenerativeModel("gemini-1.5-flash")
+
+
+def _init_model():
+    # Exported backends are built on first use; fall back to PyTorch if that fails
+    if MODEL_BACKEND != "pytorch":
+        try:
+            return load_model(MODEL_WEIGHTS, MODEL_BACKEND, MODEL_IMGSZ, MODEL_CALIBRATION_DATA)
+        except Exception as e:
+            print(f"Model backend {MODEL_BACKEND} unavailable, using pytorch: {e}")
+    return load_model(MODEL_WEIGHTS, "pytorch")  # Your trained wildfire model
+
+
+def get_db():
+    """Firebase Realtime Database module, initializing the app on first use"""
+    _get_service("firebase", _init_firebase)
+    return db
+
+
+def get_bucket():
+    """Firebase Storage bucket, initializing the app on first use"""
+    _get_service("firebase", _init_firebase)
+    return storage.bucket()
+
+
+def get_gemini_model():
+    return _get_service("gemini", _init_gemini)
+
+
+def get_model():
+    return _get_service("model", _init_model)
+
 
-# Firebase
-firebase_creds = json.loads(os.environ.get("FIREBASE_SERVICE_ACCOUNT", "{}"))
-if firebase_creds and not firebase_admin._apps:
-    cred = credentials.Certificate(firebase_creds)
-    firebase_admin.initialize_app(cred, {
-        "databaseURL": FIREBASE_DB_URL,
-        "storageBucket": FIREBASE_BUCKET
-    })
+def warm_up_services():
+    """Initialize every backend and run one dummy inference to prime the model"""
+    for name, init in (("firebase", get_db), ("gemini", get_gemini_model)):
+        try:
+            init()
+        except Exception as e:
+            print(f"Warm-up {name} error: {e}")
+    
+    try:
+        model = get_model()
+        service_status["model"] = "warming"
+        model(np.zeros((MODEL_IMGSZ, MODEL_IMGSZ, 3), dtype=np.uint8), verbose=False)
+        service_status["model"] = "ready"
+    except Exception as e:
+        service_status["model"] = f"error: {e}"
+        print(f"Warm-up model error: {e}")
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up_services, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+tracer = Tracer(TRACE_SLOW_MS, TRACE_HISTORY)
+gemini_cache = LRUTTLCache(GEMINI_CACHE_SIZE, GEMINI_CACHE_TTL)
+gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_WORKERS, thread_name_prefix="gemini")
+frame_dedup = FrameDeduplicator(PHASH_MAX_DISTANCE, PHASH_HISTORY, PHASH_TTL)
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+_push_lock = threading.Lock()
+_push_last_ms = 0
+_push_last_random = []
+stats_aggregator = (
+    StatsAggregator(lambda: get_db().reference(), STATS_FLUSH_MS, STATS_FLUSH_COUNT)
+    if STATS_FLUSH_MS > 0 else None
+)
+ingest_queue = IngestQueue(
+    None, INGEST_WORKERS, INGEST_QUEUE_SIZE,
+    aging_seconds=INGEST_AGING, reserve=INGEST_RESERVE, degrade_depth=INGEST_DEGRADE_DEPTH
+)
+burst_aggregator = BurstAggregator(None, BURST_SIZE, BURST_WINDOW)
+cascade_stats = {"frames": 0, "rechecked": 0, "tiles": 0}
+_cascade_lock = threading.Lock()
+
+
+def pipeline_stats() -> dict:
+    """Counters for the ingest queue, bursts, result caches and frame suppression"""
+    return {
+        "ingest": {
+            "queue_depth": ingest_queue.depth(),
+            "processed": ingest_queue.processed,
+            "failed": ingest_queue.failed,
+            "rejected": ingest_queue.rejected,
+            "shed": ingest_queue.shed,
+            "degraded": ingest_queue.degraded
+        },
+        "bursts": burst_aggregator.stats(),
+        "cascade": dict(cascade_stats),
+        "gemini_cache": gemini_cache.stats(),
+        "frame_dedup": frame_dedup.stats()
+    }
+
+
+def metrics() -> PlainTextResponse:
+    """Prometheus scrape target: stage latency histograms, errors and pipeline gauges"""
+    return PlainTextResponse(
+        tracer.render_metrics(pipeline_stats()),
+        media_type="text/plain; version=0.0.4"
+    )
 
-# Gemini
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY", ""))
-gemini_model = genai.GenerativeModel("gemini-1.5-flash")
 
-# YOLO Model
-model = YOLO("fire_n.pt")  # Your trained wildfire model
+def recent_traces(limit: int = 20) -> dict:
+    """Most recent request traces with their per-stage spans"""
+    return {"traces": tracer.recent(limit)}
+
+
+def readiness() -> JSONResponse:
+    """Per-component readiness; 200 only once the model and Firebase are usable"""
+    ready = service_status["model"] == "ready" and service_status["firebase"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": dict(service_status)}
+    )
 
 # ============ CORE FUNCTIONS ============
 
-def upload_image_to_storage(image: Image.Image, incident_id: str) -> tuple:
-    """Upload original image to Firebase Storage and return URL"""
+def _upload_jpeg(bucket, path: str, buffer: io.BytesIO) -> str:
+    """Upload one JPEG buffer, make it public and return its URL"""
+    blob = bucket.blob(path)
+    blob.upload_from_file(buffer, content_type="image/jpeg")
+    blob.make_public()
+    return blob.public_url
+
+
+def _encode_jpeg(image: Image.Image, quality: int) -> io.BytesIO:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+def _upload_derivatives(bucket, image: Image.Image, incident_id: str, name: str) -> dict:
+    """Upload preview and thumbnail versions of an already decoded image
+    
+    Each size is downscaled from the previous one, so the full-size pixels
+    are only resampled once.
+    """
+    urls = {}
+    derived = image
+    for label, max_side in (("preview", PREVIEW_MAX_SIDE), ("thumbnail", THUMBNAIL_MAX_SIDE)):
+        if max(derived.size) > max_side:
+            derived = derived.copy()
+            derived.thumbnail((max_side, max_side))
+        urls[f"{name}_{label}_url"] = _upload_jpeg(
+            bucket,
+            f"incidents/{incident_id}/{name}_{label}.jpg",
+            _encode_jpeg(derived, DERIVATIVE_QUALITY)
+        )
+    return urls
+
+
+def upload_image_to_storage(image: Image.Image, incident_id: str, jpeg_bytes: bytes = None) -> dict:
+    """Upload original image and its preview/thumbnail to Firebase Storage
+    
+    When the device already sent a JPEG, its bytes are stored as-is instead
+    of re-encoding the decoded image. Returns the URLs that were uploaded.
+    """
+    urls = {}
     try: 
-        bucket = storage.bucket()
+        bucket = get_bucket()
         
-        # Convert PIL Image to bytes
-        buffer = io.BytesIO()
-        image.save(buffer, format="JPEG", quality=95)
-        buffer.seek(0)
+        if jpeg_bytes is not None:
+            buffer = io.BytesIO(jpeg_bytes)
+        else:
+            # Convert PIL Image to bytes
+            buffer = _encode_jpeg(image, 95)
         
         # Upload original
-        original_path = f"incidents/{incident_id}/original.jpg"
-        blob = bucket.blob(original_path)
-        blob.upload_from_file(buffer, content_type="image/jpeg")
-        blob.make_public()
-        original_url = blob.public_url
-        
-        return original_url
+        with tracer.span("upload_original"):
+            urls["original_url"] = _upload_jpeg(bucket, f"incidents/{incident_id}/original.jpg", buffer)
+        with tracer.span("upload_original_derivatives"):
+            urls.update(_upload_derivatives(bucket, image, incident_id, "original"))
     except Exception as e:
         print(f"Storage upload error: {e}")
-        return ""
+    return urls
 
 
-def upload_annotated_image(image_array: np.ndarray, incident_id: str) -> str:
-    """Upload annotated image to Firebase Storage"""
+def upload_annotated_image(image_array: np.ndarray, incident_id: str) -> dict:
+    """Upload annotated image and its preview/thumbnail to Firebase Storage"""
+    urls = {}
     try:
-        bucket = storage.bucket()
+        bucket = get_bucket()
         
         # Convert numpy array to PIL Image to bytes
         img = Image.fromarray(image_array)
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=95)
-        buffer.seek(0)
         
         # Upload annotated
-        annotated_path = f"incidents/{incident_id}/annotated.jpg"
-        blob = bucket.blob(annotated_path)
-        blob.upload_from_file(buffer, content_type="image/jpeg")
-        blob.make_public()
-        
-        return blob.public_url
+        with tracer.span("upload_annotated"):
+            urls["annotated_url"] = _upload_jpeg(bucket, f"incidents/{incident_id}/annotated.jpg", _encode_jpeg(img, 95))
+        with tracer.span("upload_annotated_derivatives"):
+            urls.update(_upload_derivatives(bucket, img, incident_id, "annotated"))
     except Exception as e:
         print(f"Annotated upload error: {e}")
-        return ""
+    return urls
 
 
-def run_yolo_detection(image: Image.Image) -> tuple:
-    """Run YOLO detection on image"""
-    results = model(image)
-    
+def _parse_yolo_result(result) -> tuple:
+    """Convert a single YOLO result into a detection dict and annotated image"""
     detections = []
     fire_detected = False
     smoke_detected = False
     max_confidence = 0.0
     
-    for result in results:
-        boxes = result.boxes
-        for box in boxes: 
-            class_name = result.names[int(box.cls[0])].lower()
-            confidence = float(box.conf[0])
-            
-            detection = {
-                "class": class_name,
-                "confidence": round(confidence, 3),
-                "bbox": [round(x, 1) for x in box.xyxy[0].tolist()]
-            }
-            detections.append(detection)
-            
-            if "fire" in class_name: 
-                fire_detected = True
-            if "smoke" in class_name: 
-                smoke_detected = True
-            if confidence > max_confidence:
-                max_confidence = confidence
+    for box in result.boxes:
+        class_name = result.names[int(box.cls[0])].lower()
+        confidence = float(box.conf[0])
+        
+        detection = {
+            "class": class_name,
+            "confidence": round(confidence, 3),
+            "bbox": [round(x, 1) for x in box.xyxy[0].tolist()]
+        }
+        detections.append(detection)
+        
+        if "fire" in class_name: 
+            fire_detected = True
+        if "smoke" in class_name: 
+            smoke_detected = True
+        if confidence > max_confidence:
+            max_confidence = confidence
     
     # Get annotated image
-    annotated = results[0].plot()
+    with tracer.span("plot"):
+        annotated = result.plot()
     
     detection_result = {
         "fire_detected": fire_detected,
@@ -141,16 +423,104 @@ def run_yolo_detection(image: Image.Image) -> tuple:
     return detection_result, annotated
 
 
-def analyze_with_gemini(detection_result: dict, sensors: dict) -> dict:
-    """Get Gemini analysis of the situation"""
+def run_yolo_detection(image: Image.Image, recheck: bool = True) -> tuple:
+    """Run YOLO detection on image"""
+    return run_yolo_detection_batch([image], recheck)[0]
+
+
+def run_yolo_detection_batch(images: list, recheck: bool = True) -> list:
+    """Run YOLO detection on a burst of frames, one forward pass per batch
     
-    # If no fire/smoke detected, return low severity
-    if not detection_result["fire_detected"] and not detection_result["smoke_detected"]:
-        return {
-            "severity": "LOW",
-            "summary": "No fire or smoke detected in the image. Area appears safe.",
-            "action": "Continue routine monitoring. No immediate action required."
-        }
+    recheck=False keeps the cascade's low-resolution pass only (degraded path).
+    """
+    outputs = []
+    
+    for start in range(0, len(images), YOLO_MAX_BATCH):
+        chunk = images[start:start + YOLO_MAX_BATCH]
+        with tracer.span("yolo"):
+            results = run_cascade(chunk, recheck) if CASCADE else get_model()(chunk)
+        outputs.extend(_parse_yolo_result(result) for result in results)
+    
+    return outputs
+
+
+def run_cascade(images: list, recheck: bool = True) -> list:
+    """Low-resolution pass for every frame, tiled re-check for uncertain ones
+    
+    Frames whose best box is at least CASCADE_BAND[1] (accepted) or below
+    CASCADE_BAND[0] (rejected) keep the low-resolution result. The others are
+    cut into overlapping full-resolution tiles, inferred in batches, and
+    merged with the low-resolution boxes through NMS.
+    """
+    model = get_model()
+    results = model(images, imgsz=CASCADE_LOW_IMGSZ, conf=CASCADE_BAND[0])
+    
+    tiles = []
+    owners = []
+    for index, (image, result) in enumerate(zip(images, results)):
+        top = float(result.boxes.conf.max()) if len(result.boxes) else 0.0
+        if recheck and CASCADE_BAND[0] <= top < CASCADE_BAND[1]:
+            for window in tile_windows(*image.size, CASCADE_TILE, CASCADE_TILE_OVERLAP):
+                tiles.append(image.crop(window))
+                owners.append((index, window))
+    
+    tile_results = []
+    for start in range(0, len(tiles), YOLO_MAX_BATCH):
+        with tracer.span("yolo_tiles"):
+            tile_results.extend(model(tiles[start:start + YOLO_MAX_BATCH], imgsz=CASCADE_TILE, conf=DETECTION_CONFIDENCE))
+    
+    per_frame = {index: ([], []) for index in range(len(images))}
+    for (index, window), tile_result in zip(owners, tile_results):
+        per_frame[index][0].append(tile_result)
+        per_frame[index][1].append(window)
+    
+    with _cascade_lock:
+        cascade_stats["frames"] += len(images)
+        cascade_stats["rechecked"] += len({index for index, _ in owners})
+        cascade_stats["tiles"] += len(tiles)
+    
+    return [
+        merge_results(result, *per_frame[index], iou=CASCADE_NMS_IOU, min_confidence=DETECTION_CONFIDENCE)
+        for index, result in enumerate(results)
+    ]
+
+
+def _band(value, step: float):
+    """Quantize a sensor reading into a band index (None when missing)"""
+    if value is None or isinstance(value, bool):
+        return value
+    try:
+        return int(float(value) // step)
+    except (TypeError, ValueError):
+        return None
+
+
+def gemini_cache_key(detection_result: dict, sensors: dict) -> tuple:
+    """Cache key from quantized detection and sensor features
+    
+    Burst frames from one device differ only by noise, so they land in the
+    same bucket and share one Gemini assessment.
+    """
+    count = len(detection_result["detections"])
+    return (
+        detection_result["fire_detected"],
+        detection_result["smoke_detected"],
+        _band(detection_result["confidence"], GEMINI_CACHE_CONFIDENCE_STEP),
+        count if count <= 2 else (3 if count <= 5 else 6),
+        _band(sensors.get("temperature"), GEMINI_CACHE_TEMPERATURE_STEP),
+        _band(sensors.get("humidity"), GEMINI_CACHE_HUMIDITY_STEP),
+        _band(sensors.get("gas_level"), GEMINI_CACHE_GAS_STEP),
+        bool(sensors.get("flame_detected"))
+    )
+
+
+def request_gemini_analysis(detection_result: dict, sensors: dict) -> dict:
+    """Prompt Gemini for an assessment (raises on API or parse errors)"""
+    
+    cache_key = gemini_cache_key(detection_result, sensors)
+    cached = gemini_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
     
     prompt = f"""
     You are a wildfire emergency assessment AI. Analyze this detection data and provide an emergency assessment. 
@@ -176,25 +546,42 @@ def analyze_with_gemini(detection_result: dict, sensors: dict) -> dict:
     {{"severity": "HIGH", "summary": "Your assessment here", "action": "Your recommended action here"}}
     """
     
+    with tracer.span("gemini"):
+        response = get_gemini_model().generate_content(prompt)
+    text = response.text.strip()
+    
+    # Extract JSON from response
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+    
+    result = json.loads(text.strip())
+    
+    # Validate severity
+    if result.get("severity") not in ["LOW", "MEDIUM", "HIGH", "CRITICAL"]:
+        result["severity"] = "MEDIUM"
+    
+    gemini_cache.set(cache_key, dict(result))
+    return result
+
+
+def analyze_with_gemini(detection_result: dict, sensors: dict) -> dict:
+    """Get Gemini analysis of the situation"""
+    
+    # If no fire/smoke detected, return low severity
+    if not detection_result["fire_detected"] and not detection_result["smoke_detected"]:
+        return {
+            "severity": "LOW",
+            "summary": "No fire or smoke detected in the image. Area appears safe.",
+            "action": "Continue routine monitoring. No immediate action required."
+        }
+    
     try:
-        response = gemini_model.generate_content(prompt)
-        text = response.text.strip()
-        
-        # Extract JSON from response
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0]
-        
-        result = json.loads(text.strip())
-        
-        # Validate severity
-        if result.get("severity") not in ["LOW", "MEDIUM", "HIGH", "CRITICAL"]:
-            result["severity"] = "MEDIUM"
-        
-        return result
+        return request_gemini_analysis(detection_result, sensors)
     except Exception as e:
         print(f"Gemini error: {e}")
+        tracer.error("gemini_fallback")
         # Default response based on detection
         severity = "HIGH" if detection_result["fire_detected"] else "MEDIUM"
         return {
@@ -204,37 +591,244 @@ def analyze_with_gemini(detection_result: dict, sensors: dict) -> dict:
         }
 
 
-def update_stats(severity: str):
+def sensor_risk_points(sensors: dict) -> int:
+    """Sensor part of the local severity score (0..SENSOR_RISK_MAX_POINTS)"""
+    score = 0
+    temperature = sensors.get("temperature")
+    humidity = sensors.get("humidity")
+    gas_level = sensors.get("gas_level")
+    if temperature is not None:
+        score += 2 if temperature > 45 else (1 if temperature > 35 else 0)
+    if humidity is not None:
+        score += 2 if humidity < 20 else (1 if humidity < 35 else 0)
+    if gas_level is not None:
+        score += 2 if gas_level > 400 else (1 if gas_level > 250 else 0)
+    score += 2 if sensors.get("flame_detected") else 0
+    return score
+
+
+def score_severity_locally(detection_result: dict, sensors: dict) -> dict:
+    """Deterministic provisional severity from detections and sensor thresholds"""
+    
+    if not detection_result["fire_detected"] and not detection_result["smoke_detected"]:
+        return {
+            "severity": "LOW",
+            "summary": "No fire or smoke detected in the image. Area appears safe.",
+            "action": "Continue routine monitoring. No immediate action required.",
+            "source": "local"
+        }
+    
+    score = 0
+    score += 3 if detection_result["fire_detected"] else 0
+    score += 2 if detection_result["smoke_detected"] else 0
+    
+    confidence = detection_result["confidence"]
+    score += 2 if confidence >= 0.75 else (1 if confidence >= 0.5 else 0)
+    score += 1 if len(detection_result["detections"]) >= 3 else 0
+    score += sensor_risk_points(sensors)
+    
+    severity = "LOW"
+    for threshold, level in LOCAL_SEVERITY_THRESHOLDS:
+        if score >= threshold:
+            severity = level
+            break
+    
+    return {
+        "severity": severity,
+        "summary": f"{'Fire' if detection_result['fire_detected'] else 'Smoke'} detected with {confidence*100:.1f}% confidence (sensor risk score {score}). Provisional assessment, AI analysis pending.",
+        "action": LOCAL_SEVERITY_ACTIONS[severity],
+        "source": "local"
+    }
+
+
+def enrich_incident_analysis(
+    incident_id: str,
+    detection_result: dict,
+    sensors: dict,
+    provisional: dict,
+    timestamp: int = None
+) -> dict:
+    """Replace a provisional analysis with Gemini's and correct the stats"""
+    try:
+        analysis = request_gemini_analysis(detection_result, sensors)
+    except Exception as e:
+        print(f"Gemini enrichment error for {incident_id}: {e}")
+        tracer.error("gemini_enrichment")
+        return provisional
+    
+    analysis["source"] = "gemini"
+    try:
+        updates = {
+            f"incidents/{incident_id}/analysis": analysis,
+            f"incidents/{incident_id}/updated_at": int(datetime.now().timestamp() * 1000)
+        }
+        if analysis["severity"] != provisional["severity"]:
+            updates.update(stats_updates(stats_deltas(
+                analysis["severity"],
+                previous_severity=provisional["severity"],
+                timestamp=timestamp
+            )))
+        with tracer.span("firebase_enrich"):
+            get_db().reference().update(updates)
+    except Exception as e:
+        print(f"Analysis patch error for {incident_id}: {e}")
+    
+    return analysis
+
+
+def rollup_buckets(timestamp: int) -> list:
+    """Daily and hourly rollup nodes (UTC) an incident timestamp falls into"""
+    moment = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+    return [
+        f"rollups/daily/{moment:%Y-%m-%d}",
+        f"rollups/hourly/{moment:%Y-%m-%dT%H}"
+    ]
+
+
+def _rtdb_key(value) -> str:
+    """Make a value safe to use as a Realtime Database key"""
+    return re.sub(r"[.$#\[\]/]", "_", str(value)) or "unknown"
+
+
+def stats_deltas(
+    severity: str,
+    previous_severity: str = None,
+    timestamp: int = None,
+    status: str = None,
+    device_id: str = None
+) -> dict:
+    """Counter changes (root-relative paths) for a new or re-classified incident
+    
+    Besides the global `stats` counters, an incident with a timestamp also
+    counts into its daily and hourly `rollups` buckets, split by severity,
+    status and device, so dashboard analytics never scan raw incidents.
+    With previous_severity, an existing incident is re-classified: its old
+    severity counts move to the new one and totals are left alone.
+    """
+    deltas = {}
+    
+    def add(path, delta):
+        deltas[path] = deltas.get(path, 0) + delta
+    
+    if previous_severity is None:
+        add("stats/total_incidents", 1)
+    else:
+        add(f"stats/{previous_severity.lower()}_count", -1)
+    add(f"stats/{severity.lower()}_count", 1)
+    
+    if timestamp is not None:
+        for bucket in rollup_buckets(timestamp):
+            if previous_severity is None:
+                add(f"{bucket}/total", 1)
+                add(f"{bucket}/status/{_rtdb_key(status)}", 1)
+                add(f"{bucket}/devices/{_rtdb_key(device_id)}", 1)
+            else:
+                add(f"{bucket}/severity/{_rtdb_key(previous_severity)}", -1)
+            add(f"{bucket}/severity/{_rtdb_key(severity)}", 1)
+    
+    return deltas
+
+
+def stats_updates(deltas: dict, latest: dict = None) -> dict:
+    """Root-relative paths for a multi-location update
+    
+    Counters use server-side atomic increments, so concurrent workers never
+    overwrite each other. When STATS_FLUSH_MS is set, the increments go to
+    the in-process aggregator instead and no paths are returned.
+    """
+    if stats_aggregator is not None:
+        stats_aggregator.add(deltas, latest)
+        return {}
+    
+    return build_stats_update(deltas, latest)
+
+
+def update_stats(severity: str, previous_severity: str = None):
     """Update global stats in Firebase"""
     try:
-        stats_ref = db.reference("stats")
-        stats = stats_ref.get() or {}
-        
-        stats["total_incidents"] = stats.get("total_incidents", 0) + 1
-        stats["last_detection"] = int(datetime.now().timestamp() * 1000)
-        
-        severity_key = f"{severity.lower()}_count"
-        stats[severity_key] = stats.get(severity_key, 0) + 1
-        
-        stats_ref.set(stats)
+        latest = None
+        if previous_severity is None:
+            latest = {"stats/last_detection": int(datetime.now().timestamp() * 1000)}
+        updates = stats_updates(stats_deltas(severity, previous_severity), latest)
+        if updates:
+            with tracer.span("firebase_stats"):
+                get_db().reference().update(updates)
     except Exception as e:
         print(f"Stats update error: {e}")
 
 
-def save_incident_to_firebase(
+def generate_push_id() -> str:
+    """Chronologically sortable 20-char key, same scheme as Firebase push()
+    
+    Generated locally so the incident key is known before any network call.
+    """
+    global _push_last_ms, _push_last_random
+    
+    with _push_lock:
+        now = int(time.time() * 1000)
+        if now == _push_last_ms:
+            # Same millisecond: increment the random suffix to stay ordered
+            index = len(_push_last_random) - 1
+            while index >= 0 and _push_last_random[index] == 63:
+                _push_last_random[index] = 0
+                index -= 1
+            if index >= 0:
+                _push_last_random[index] += 1
+        else:
+            _push_last_random = [random.randrange(64) for _ in range(12)]
+            _push_last_ms = now
+        
+        timestamp_chars = []
+        for _ in range(8):
+            timestamp_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        
+        return "".join(reversed(timestamp_chars)) + "".join(PUSH_CHARS[i] for i in _push_last_random)
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash of a coordinate; prefixes of it name the enclosing grid cells"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    
+    return "".join(chars)
+
+
+def build_incident(
     detection_result: dict,
     analysis: dict,
     sensors: dict,
     latitude: float,
     longitude: float,
     original_url: str,
-    annotated_url: str
-) -> str:
-    """Save complete incident to Firebase"""
+    annotated_url: str,
+    incident_id: str = None,
+    derivatives: dict = None
+) -> dict:
+    """Assemble the incident record stored under incidents/<id>
     
-    # Generate incident ID
-    incident_ref = db.reference("incidents").push()
-    incident_id = incident_ref.key
+    derivatives holds extra image URLs (previews, thumbnails) for the images node.
+    """
     
     # Determine status
     if not detection_result["fire_detected"] and not detection_result["smoke_detected"]:
@@ -242,39 +836,274 @@ def save_incident_to_firebase(
     else: 
         status = "confirmed"
     
-    incident = {
-        "id": incident_id,
-        "timestamp": int(datetime.now().timestamp() * 1000),
+    timestamp = int(datetime.now().timestamp() * 1000)
+    
+    return {
+        "id": incident_id or generate_push_id(),
+        "timestamp": timestamp,
+        "updated_at": timestamp,
         "device_id": "demo-upload",
         "location": {
             "latitude": latitude,
             "longitude": longitude
         },
+        "geohash": geohash_encode(latitude, longitude),
         "sensors": sensors,
         "detection": detection_result,
         "analysis": analysis,
         "images": {
             "original_url": original_url,
-            "annotated_url": annotated_url
+            "annotated_url": annotated_url,
+            **(derivatives or {})
         },
         "status": status
     }
+
+
+def save_incidents_to_firebase(incidents: list) -> list:
+    """Persist many incidents, device heartbeats and stats in one atomic update"""
+    if not incidents:
+        return []
     
-    # Save to Firebase
-    incident_ref.set(incident)
+    updates = {}
+    deltas = {}
+    latest = {}
     
-    # Update device last_seen
-    db.reference("devices/demo-upload/last_seen").set(int(datetime.now().timestamp() * 1000))
-    db.reference("devices/demo-upload/status").set("online")
+    for incident in incidents:
+        updates[f"incidents/{incident['id']}"] = incident
+        
+        # Update device last_seen
+        device_id = incident["device_id"]
+        updates[f"devices/{device_id}/last_seen"] = incident["timestamp"]
+        updates[f"devices/{device_id}/status"] = "online"
+        
+        # Update stats and rollups (increments for the same path are summed)
+        incident_deltas = stats_deltas(
+            incident["analysis"].get("severity", "MEDIUM"),
+            timestamp=incident["timestamp"],
+            status=incident["status"],
+            device_id=device_id
+        )
+        for path, delta in incident_deltas.items():
+            deltas[path] = deltas.get(path, 0) + delta
+        latest["stats/last_detection"] = max(latest.get("stats/last_detection", 0), incident["timestamp"])
     
-    # Update stats
-    update_stats(analysis.get("severity", "MEDIUM"))
+    updates.update(stats_updates(deltas, latest))
+    if updates:
+        with tracer.span("firebase_save"):
+            get_db().reference().update(updates)
     
-    return incident_id
+    return [incident["id"] for incident in incidents]
+
+
+def save_incident_to_firebase(
+    detection_result: dict,
+    analysis: dict,
+    sensors: dict,
+    latitude: float,
+    longitude: float,
+    original_url: str,
+    annotated_url: str,
+    incident_id: str = None
+) -> str:
+    """Save complete incident to Firebase"""
+    incident = build_incident(
+        detection_result, analysis, sensors, latitude, longitude,
+        original_url, annotated_url, incident_id
+    )
+    return save_incidents_to_firebase([incident])[0]
 
 
 # ============ MAIN DETECTION FUNCTION ============
 
+def await_stage(future, stage: str, default=None):
+    """Wait for a pipeline stage up to its timeout, falling back to default
+    
+    default may be a callable, evaluated only when the stage fails.
+    """
+    try:
+        return future.result(timeout=STAGE_TIMEOUTS.get(stage))
+    except TimeoutError:
+        print(f"Stage {stage} timed out after {STAGE_TIMEOUTS.get(stage)}s")
+        tracer.error(f"{stage}_timeout")
+    except Exception as e:
+        print(f"Stage {stage} error: {e}")
+        tracer.error(stage)
+    return default() if callable(default) else default
+
+
+def run_pipeline(
+    image: Image.Image,
+    sensors: dict,
+    latitude: float,
+    longitude: float,
+    jpeg_bytes: bytes = None,
+    device_id: str = "demo-upload",
+    degraded: bool = False
+) -> dict:
+    """Run detection, analysis, upload and persistence for one frame
+    
+    A frame whose perceptual hash is within PHASH_MAX_DISTANCE bits of a
+    recent frame from the same device reuses that frame's result instead.
+    """
+    if PHASH_MAX_DISTANCE < 0:
+        return _run_pipeline_stages(image, sensors, latitude, longitude, jpeg_bytes, degraded=degraded)
+    
+    future, duplicate = frame_dedup.claim(device_id, dhash(image))
+    if duplicate:
+        try:
+            previous = future.result(timeout=PHASH_WAIT_TIMEOUT)
+            frame_dedup.mark_suppressed()
+            return {**previous, "duplicate": True}
+        except Exception:
+            # The earlier frame failed or is stuck; process this one on its own
+            return _run_pipeline_stages(image, sensors, latitude, longitude, jpeg_bytes, degraded=degraded)
+    
+    try:
+        result = _run_pipeline_stages(image, sensors, latitude, longitude, jpeg_bytes, degraded=degraded)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    future.set_result(result)
+    return result
+
+
+def _run_pipeline_stages(
+    image: Image.Image,
+    sensors: dict,
+    latitude: float,
+    longitude: float,
+    jpeg_bytes: bytes = None,
+    detection: tuple = None,
+    degraded: bool = False
+) -> dict:
+    """Detection, analysis, uploads and persistence for a frame that was not suppressed
+    
+    detection is an already computed (detection_result, annotated) pair, e.g.
+    a fused burst; YOLO is skipped when it is given. A degraded (low-risk,
+    overloaded) frame skips the tiled re-check and Gemini, keeping the local score.
+    """
+    
+    # Step 1: Generate the incident key locally, it doubles as the storage path
+    incident_id = generate_push_id()
+    tracer.annotate(incident_id=incident_id)
+    
+    # Step 2: The original upload only needs the input, start it before YOLO
+    original_future = tracer.submit(stage_executor, upload_image_to_storage, image, incident_id, jpeg_bytes)
+    
+    # Step 3: Run YOLO Detection
+    detection_result, annotated_image = detection or run_yolo_detection(image, recheck=not degraded)
+    
+    # Step 4: Annotated upload and severity analysis run side by side - a local
+    # provisional score when Gemini runs in the background, so the incident is
+    # persisted without waiting on it
+    annotated_future = tracer.submit(stage_executor, upload_annotated_image, annotated_image, incident_id)
+    
+    needs_gemini = (detection_result["fire_detected"] or detection_result["smoke_detected"]) and not degraded
+    if GEMINI_ASYNC or degraded:
+        analysis = score_severity_locally(detection_result, sensors)
+    else:
+        analysis_future = tracer.submit(stage_executor, analyze_with_gemini, detection_result, sensors)
+        analysis = await_stage(
+            analysis_future, "gemini",
+            default=lambda: score_severity_locally(detection_result, sensors)
+        )
+    
+    image_urls = {
+        **await_stage(original_future, "upload_original", default={}),
+        **await_stage(annotated_future, "upload_annotated", default={})
+    }
+    
+    # Step 5: Save to Firebase
+    incident = build_incident(
+        detection_result=detection_result,
+        analysis=analysis,
+        sensors=sensors,
+        latitude=latitude,
+        longitude=longitude,
+        original_url=image_urls.pop("original_url", ""),
+        annotated_url=image_urls.pop("annotated_url", ""),
+        incident_id=incident_id,
+        derivatives=image_urls
+    )
+    save_incidents_to_firebase([incident])
+    
+    # Step 6: Gemini enrichment patches the incident once it returns
+    enrichment = None
+    if GEMINI_ASYNC and needs_gemini:
+        enrichment = tracer.submit(
+            gemini_executor, enrich_incident_analysis, incident_id, detection_result, sensors, analysis,
+            incident["timestamp"]
+        )
+    
+    return {
+        "incident_id": incident_id,
+        "detection": detection_result,
+        "annotated": annotated_image,
+        "analysis": analysis,
+        "enrichment": enrichment,
+        "duplicate": False
+    }
+
+
+def fuse_detections(outputs: list) -> tuple:
+    """Fuse per-frame (detection_result, annotated) pairs of a burst
+    
+    Returns the fused detection and the index of the best frame, whose boxes
+    and images represent the burst.
+    """
+    confidences = [result["confidence"] for result, _ in outputs]
+    best = max(range(len(outputs)), key=lambda i: (confidences[i], len(outputs[i][0]["detections"])))
+    best_result = outputs[best][0]
+    
+    fused = {
+        "fire_detected": any(result["fire_detected"] for result, _ in outputs),
+        "smoke_detected": any(result["smoke_detected"] for result, _ in outputs),
+        "confidence": best_result["confidence"],
+        "mean_confidence": round(sum(confidences) / len(confidences), 3),
+        "detections": best_result["detections"],
+        "frames": len(outputs),
+        "frames_with_detections": sum(1 for result, _ in outputs if result["detections"])
+    }
+    return fused, best
+
+
+def run_burst_pipeline(frames: list, device_id: str = "esp32-cam") -> dict:
+    """Turn the frames of one trigger into a single fused incident
+    
+    Near-duplicate frames are dropped, the rest go through YOLO in one batch,
+    and only the fused incident (with the best frame's images) is uploaded
+    and persisted.
+    """
+    if PHASH_MAX_DISTANCE >= 0:
+        kept = frame_dedup.unique([dhash(frame["image"]) for frame in frames])
+        frames = [frames[index] for index in kept]
+    
+    # A burst is only degraded when every frame of it was
+    degraded = all(frame.get("degraded") for frame in frames)
+    outputs = run_yolo_detection_batch([frame["image"] for frame in frames], recheck=not degraded)
+    detection_result, best = fuse_detections(outputs)
+    best_frame = frames[best]
+    detection_result["best_frame"] = best_frame.get("frame_number")
+    
+    result = _run_pipeline_stages(
+        best_frame["image"], best_frame["sensors"], best_frame["latitude"], best_frame["longitude"],
+        best_frame.get("jpeg_bytes"), detection=(detection_result, outputs[best][1]), degraded=degraded
+    )
+    result["frames"] = len(frames)
+    return result
+
+
+def handle_burst(device_id: str, frames: list):
+    """BurstAggregator handler: persist one incident for a closed burst"""
+    with tracer.trace(device_id=device_id, frames=len(frames)):
+        result = run_burst_pipeline(frames, device_id)
+    print(
+        f"Burst from {device_id} ({len(frames)} frames, {result['frames']} analyzed) "
+        f"-> incident {result['incident_id']}"
+    )
+
+
 def process_image(
     image: Image.Image,
     latitude: float,
@@ -298,29 +1127,19 @@ def process_image(
             "flame_detected": flame_detected
         }
         
-        # Step 1: Run YOLO Detection
-        detection_result, annotated_image = run_yolo_detection(image)
+        with tracer.trace(source="gradio"):
+            result = run_pipeline(image, sensors, latitude, longitude)
+        detection_result = result["detection"]
+        annotated_image = result["annotated"]
+        analysis = result["analysis"]
+        incident_id = result["incident_id"]
         
-        # Step 2: Gemini Analysis
-        analysis = analyze_with_gemini(detection_result, sensors)
-        
-        # Step 3: Generate temp incident ID for storage
-        temp_id = f"temp_{int(datetime.now().timestamp() * 1000)}"
-        
-        # Step 4: Upload images to Firebase Storage
-        original_url = upload_image_to_storage(image, temp_id)
-        annotated_url = upload_annotated_image(annotated_image, temp_id)
-        
-        # Step 5: Save to Firebase
-        incident_id = save_incident_to_firebase(
-            detection_result=detection_result,
-            analysis=analysis,
-            sensors=sensors,
-            latitude=latitude,
-            longitude=longitude,
-            original_url=original_url,
-            annotated_url=annotated_url
-        )
+        # The incident is already saved; give the UI a chance to show Gemini's view
+        if result["enrichment"] is not None:
+            try:
+                analysis = result["enrichment"].result(timeout=GEMINI_UI_TIMEOUT)
+            except TimeoutError:
+                pass
         
         # Prepare output
         severity = analysis.get("severity", "UNKNOWN")
@@ -346,6 +1165,7 @@ def process_image(
         
         status_text = f"""
 ### ✅ Saved to Firebase
+{"♻️ *Near-duplicate of a recent frame, showing its saved incident*" if result["duplicate"] else ""}
 - **Incident ID:** `{incident_id}`
 - **Location:** {latitude}°N, {longitude}°E
 - **Status:** {"🔥 Confirmed" if detection_result["fire_detected"] or detection_result["smoke_detected"] else "✅ False Alarm"}
@@ -363,6 +1183,65 @@ def process_image(
         return None, error_msg, "", "", str(e)
 
 
+# ============ ESP32 INGEST ============
+
+def ingest_priority(job: dict):
+    """Queue risk in [0, 1] from the frame's own sensor readings (None if it sent none)"""
+    sensors = job.get("sensors") or {}
+    if not any(sensors.get(key) is not None for key in ("temperature", "humidity", "gas_level", "flame_detected")):
+        return None
+    return sensor_risk_points(sensors) / SENSOR_RISK_MAX_POINTS
+
+
+def handle_ingest_job(job: dict):
+    """Pipeline worker entry point for frames queued by the ingest server
+    
+    Numbered frames are collected into bursts (one incident per trigger);
+    frames without a frame number run through the pipeline on their own.
+    """
+    device_id = job.get("device_id", "esp32-cam")
+    tracer.observe("queue_wait", max(0.0, time.time() - job["received_at"] / 1000))
+    with tracer.trace(job["job_id"], device_id=device_id, frame_number=job.get("frame_number")):
+        _process_ingest_job(job, device_id)
+
+
+def _process_ingest_job(job: dict, device_id: str):
+    jpeg_bytes = job["image_bytes"]
+    
+    # Decode pixels once for inference; the original JPEG goes to storage untouched
+    with tracer.span("decode"):
+        image = Image.open(io.BytesIO(jpeg_bytes))
+        if image.format != "JPEG":
+            jpeg_bytes = None
+        image.load()
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    
+    sensors = {**DEFAULT_SENSORS, **(job.get("sensors") or {})}
+    latitude = float(job.get("latitude") or DEFAULT_LATITUDE)
+    longitude = float(job.get("longitude") or DEFAULT_LONGITUDE)
+    
+    frame_number = job.get("frame_number")
+    if BURST_SIZE > 1 and frame_number not in (None, ""):
+        # The frame outlives this job, so copy the pooled bytes
+        device_timestamp = job.get("device_timestamp")
+        burst_aggregator.add(device_id, {
+            "frame_number": int(frame_number),
+            "device_timestamp": int(device_timestamp) if device_timestamp not in (None, "") else None,
+            "image": image,
+            "jpeg_bytes": bytes(jpeg_bytes) if jpeg_bytes is not None else None,
+            "sensors": sensors,
+            "latitude": latitude,
+            "longitude": longitude,
+            "degraded": job.get("degraded", False)
+        })
+        return
+    
+    result = run_pipeline(image, sensors, latitude, longitude, jpeg_bytes, device_id, job.get("degraded", False))
+    reused = " (near-duplicate, reused)" if result["duplicate"] else ""
+    print(f"Ingest job {job['job_id']} (frame {job.get('frame_number')}) -> incident {result['incident_id']}{reused}")
+
+
 # ============ GRADIO INTERFACE ============
 
 with gr.Blocks(
@@ -476,5 +1355,27 @@ with gr.Blocks(
     )
 
 # Launch
+def create_server(mount_ui: bool = True) -> FastAPI:
+    """Ingest, health and metrics routes (plus the Gradio UI) on one FastAPI app"""
+    ingest_queue.handler = handle_ingest_job
+    ingest_queue.priority = ingest_priority
+    burst_aggregator.handler = handle_burst
+    
+    server = FastAPI()
+    server.include_router(create_ingest_router(ingest_queue, INGEST_API_KEY))
+    server.add_api_route("/ready", readiness, methods=["GET"])
+    server.add_api_route("/api/stats", pipeline_stats, methods=["GET"])
+    server.add_api_route("/api/traces", recent_traces, methods=["GET"])
+    server.add_api_route("/metrics", metrics, methods=["GET"])
+    if mount_ui:
+        server = gr.mount_gradio_app(server, demo, path="/")
+    return server
+
+
 if __name__ == "__main__":
-    demo.launch()
\ No newline at end of file
+    server = create_server()
+    
+    # Accept uploads right away; workers block on lazy init until warm-up finishes
+    ingest_queue.start()
+    start_warm_up()
+    uvicorn.run(server, host="0.0.0.0", port=SERVER_PORT)
@@ -0,0 +1,399 @@
+"""
+⏱️ Pipeline Benchmark
+Drives the app.py pipeline against in-process fakes of Firebase RTDB, Storage
+and Gemini (with injected latency) and reports per-stage latency percentiles,
+throughput and peak RSS for each image size / burst size combination.
+
+    python benchmark.py --sizes 640x480,1600x1200 --bursts 1,5 --iterations 20
+    python benchmark.py --fake-model-ms 40 --gemini-latency-ms 800   # no weights needed
+"""
+
+import argparse
+import json
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import app
+
+STAGES = (
+    "detection",
+    "gemini",
+    "upload_original",
+    "upload_annotated",
+    "save",
+    "enrichment",
+    "pipeline"
+)
+
+
+# ============ FAKES ============
+
+def _sleep_ms(latency_ms: float, jitter: float = 0.2):
+    if latency_ms > 0:
+        time.sleep(latency_ms * random.uniform(1 - jitter, 1 + jitter) / 1000)
+
+
+class FakeReference:
+    """Minimal firebase_admin.db.Reference backed by a shared dict"""
+
+    def __init__(self, database, path: str = "/"):
+        self.database = database
+        self.path = path.strip("/")
+
+    def child(self, path: str):
+        return FakeReference(self.database, f"{self.path}/{path}")
+
+    def _key(self, path: str) -> str:
+        return "/".join(part for part in (self.path, path.strip("/")) if part)
+
+    def update(self, values: dict):
+        _sleep_ms(self.database.latency_ms)
+        with self.database.lock:
+            self.database.writes += 1
+            for path, value in values.items():
+                self.database.data[self._key(path)] = value
+
+    def set(self, value):
+        self.update({"": value})
+
+    def get(self):
+        _sleep_ms(self.database.latency_ms)
+        with self.database.lock:
+            return self.database.data.get(self.path)
+
+
+class FakeDatabase:
+    """Stands in for the firebase_admin.db module"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.data = {}
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def reference(self, path: str = "/"):
+        return FakeReference(self, path)
+
+
+class FakeBlob:
+    def __init__(self, bucket, path: str):
+        self.bucket = bucket
+        self.path = path
+        self.public_url = f"https://storage.invalid/{path}"
+
+    def upload_from_file(self, file_obj, content_type: str = None):
+        data = file_obj.read()
+        _sleep_ms(self.bucket.latency_ms + len(data) / 1024 * self.bucket.ms_per_kb)
+        with self.bucket.lock:
+            self.bucket.uploads += 1
+            self.bucket.bytes_uploaded += len(data)
+
+    def make_public(self):
+        pass
+
+
+class FakeBucket:
+    """Storage bucket whose uploads cost a fixed latency plus ms_per_kb"""
+
+    def __init__(self, latency_ms: float = 0.0, ms_per_kb: float = 0.0):
+        self.latency_ms = latency_ms
+        self.ms_per_kb = ms_per_kb
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self.lock = threading.Lock()
+
+    def blob(self, path: str) -> FakeBlob:
+        return FakeBlob(self, path)
+
+
+class FakeStorage:
+    """Stands in for the firebase_admin.storage module"""
+
+    def __init__(self, bucket: FakeBucket):
+        self._bucket = bucket
+
+    def bucket(self):
+        return self._bucket
+
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Answers every prompt with a fixed assessment after latency_ms"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str) -> FakeGeminiResponse:
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.calls += 1
+        return FakeGeminiResponse(json.dumps({
+            "severity": "HIGH",
+            "summary": "Benchmark assessment.",
+            "action": "No action, benchmark run."
+        }))
+
+
+class FakeBox:
+    def __init__(self, cls: int, conf: float, xyxy: list):
+        self.cls = np.array([cls])
+        self.conf = np.array([conf])
+        self.xyxy = np.array([xyxy], dtype=np.float32)
+
+
+class FakeResult:
+    names = {0: "fire", 1: "smoke"}
+
+    def __init__(self, image: Image.Image, boxes: list):
+        self.image = image
+        self.boxes = boxes
+
+    def plot(self) -> np.ndarray:
+        return np.asarray(self.image)
+
+
+class FakeModel:
+    """YOLO stand-in: per-batch latency plus per-image latency, random boxes"""
+
+    def __init__(self, latency_ms: float, detection_rate: float = 0.5):
+        self.latency_ms = latency_ms
+        self.detection_rate = detection_rate
+
+    def __call__(self, images, **kwargs):
+        images = images if isinstance(images, list) else [images]
+        _sleep_ms(self.latency_ms * (1 + 0.25 * (len(images) - 1)))
+        results = []
+        for image in images:
+            if not isinstance(image, Image.Image):
+                image = Image.fromarray(image)
+            boxes = []
+            if random.random() < self.detection_rate:
+                width, height = image.size
+                boxes.append(FakeBox(random.randint(0, 1), random.uniform(0.3, 0.95),
+                                     [0.2 * width, 0.2 * height, 0.6 * width, 0.6 * height]))
+            results.append(FakeResult(image, boxes))
+        return results
+
+
+# ============ STAGE TIMING ============
+
+class StageTimer:
+    """Wraps app functions so every call records its wall time per stage"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+        self._originals = []
+
+    def wrap(self, name: str, stage: str):
+        original = getattr(app, name)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        self._originals.append((name, original))
+        setattr(app, name, timed)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds * 1000)
+
+    def reset(self):
+        with self._lock:
+            self.samples = {stage: [] for stage in STAGES}
+
+    def restore(self):
+        for name, original in reversed(self._originals):
+            setattr(app, name, original)
+        self._originals = []
+
+    def percentiles(self) -> dict:
+        with self._lock:
+            return {
+                stage: {
+                    "count": len(values),
+                    "p50": round(float(np.percentile(values, 50)), 1),
+                    "p95": round(float(np.percentile(values, 95)), 1),
+                    "p99": round(float(np.percentile(values, 99)), 1)
+                }
+                for stage, values in self.samples.items() if values
+            }
+
+
+def install_fakes(args) -> dict:
+    """Point the app's lazy service getters at in-process fakes"""
+    fakes = {
+        "db": FakeDatabase(args.db_latency_ms),
+        "bucket": FakeBucket(args.storage_latency_ms, args.storage_ms_per_kb),
+        "gemini": FakeGeminiModel(args.gemini_latency_ms)
+    }
+    app.db = fakes["db"]
+    app.storage = FakeStorage(fakes["bucket"])
+    app._services["firebase"] = True
+    app._services["gemini"] = fakes["gemini"]
+    for name in ("firebase", "gemini"):
+        app.service_status[name] = "ready"
+
+    if args.fake_model_ms is not None:
+        app._services["model"] = FakeModel(args.fake_model_ms, args.detection_rate)
+        app.service_status["model"] = "ready"
+        # The cascade merges real ultralytics results; fake ones take the single-pass path
+        app.CASCADE = False
+    else:
+        app.warm_up_services()
+
+    if args.no_gemini_cache:
+        app.gemini_cache.max_size = 0
+    if args.no_dedup:
+        app.PHASH_MAX_DISTANCE = -1
+    return fakes
+
+
+# ============ RUNS ============
+
+def _random_frame(width: int, height: int) -> Image.Image:
+    # Noise keeps every frame distinct, so near-duplicate suppression stays out of the way
+    pixels = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def _run_once(timer: StageTimer, width: int, height: int, burst: int, sensors: dict):
+    """One frame or burst through the pipeline; "pipeline" ends once the incident is saved"""
+    started = time.perf_counter()
+    if burst <= 1:
+        result = app.run_pipeline(_random_frame(width, height), sensors, app.DEFAULT_LATITUDE, app.DEFAULT_LONGITUDE)
+    else:
+        frames = [
+            {
+                "frame_number": number,
+                "device_timestamp": None,
+                "image": _random_frame(width, height),
+                "jpeg_bytes": None,
+                "sensors": sensors,
+                "latitude": app.DEFAULT_LATITUDE,
+                "longitude": app.DEFAULT_LONGITUDE
+            }
+            for number in range(1, burst + 1)
+        ]
+        result = app.run_burst_pipeline(frames, "benchmark")
+    timer.record("pipeline", time.perf_counter() - started)
+    if result["enrichment"] is not None:
+        result["enrichment"].result()
+
+
+def run_benchmark(args) -> list:
+    fakes = install_fakes(args)
+    timer = StageTimer()
+    for name, stage in (
+        ("run_yolo_detection_batch", "detection"),
+        ("request_gemini_analysis", "gemini"),
+        ("upload_image_to_storage", "upload_original"),
+        ("upload_annotated_image", "upload_annotated"),
+        ("save_incidents_to_firebase", "save"),
+        ("enrich_incident_analysis", "enrichment")
+    ):
+        timer.wrap(name, stage)
+
+    reports = []
+    try:
+        for size in args.sizes:
+            width, height = size
+            for burst in args.bursts:
+                # Warm-up iteration, not measured
+                _run_once(timer, width, height, burst, app.DEFAULT_SENSORS)
+                timer.reset()
+                writes, uploads = fakes["db"].writes, fakes["bucket"].uploads
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                    futures = [
+                        executor.submit(_run_once, timer, width, height, burst, app.DEFAULT_SENSORS)
+                        for _ in range(args.iterations)
+                    ]
+                    for future in futures:
+                        future.result()
+                elapsed = time.perf_counter() - started
+
+                images = args.iterations * burst
+                reports.append({
+                    "size": f"{width}x{height}",
+                    "burst": burst,
+                    "iterations": args.iterations,
+                    "concurrency": args.concurrency,
+                    "images_per_second": round(images / elapsed, 2),
+                    "db_writes": fakes["db"].writes - writes,
+                    "uploads": fakes["bucket"].uploads - uploads,
+                    # ru_maxrss is in KiB on Linux
+                    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                    "stages": timer.percentiles()
+                })
+    finally:
+        timer.restore()
+    return reports
+
+
+def print_report(reports: list):
+    for report in reports:
+        print(
+            f"\n{report['size']} burst={report['burst']} x{report['iterations']} "
+            f"(concurrency {report['concurrency']}): {report['images_per_second']} images/s, "
+            f"{report['db_writes']} db writes, {report['uploads']} uploads, "
+            f"peak RSS {report['peak_rss_mb']} MB"
+        )
+        print(f"  {'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, values in report["stages"].items():
+            print(f"  {stage:<18}{values['count']:>7}{values['p50']:>10}{values['p95']:>10}{values['p99']:>10}")
+
+
+def _parse_sizes(value: str) -> list:
+    return [tuple(int(part) for part in size.lower().split("x")) for size in value.split(",")]
+
+
+def _parse_ints(value: str) -> list:
+    return [int(part) for part in value.split(",")]
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser):
+    """CLI flags read by install_fakes()"""
+    parser.add_argument("--db-latency-ms", type=float, default=50)
+    parser.add_argument("--storage-latency-ms", type=float, default=150)
+    parser.add_argument("--storage-ms-per-kb", type=float, default=0.05)
+    parser.add_argument("--gemini-latency-ms", type=float, default=1200)
+    parser.add_argument("--fake-model-ms", type=float, default=None,
+                        help="Replace YOLO with a fake of this latency (no weights needed)")
+    parser.add_argument("--detection-rate", type=float, default=0.5, help="Share of fake-model frames with a box")
+    parser.add_argument("--no-gemini-cache", action="store_true")
+    parser.add_argument("--no-dedup", action="store_true")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline against local fakes")
+    parser.add_argument("--sizes", type=_parse_sizes, default=_parse_sizes("640x480,1600x1200"))
+    parser.add_argument("--bursts", type=_parse_ints, default=[1, 5], help="Frames per trigger (1 = single frames)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    add_fake_arguments(parser)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    reports = run_benchmark(args)
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
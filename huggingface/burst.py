@@ -0,0 +1,103 @@
+"""
+🎞️ Burst Aggregator
+Groups the frames one ESP32 trigger sends (frameNumber 1..NUM_FRAMES) into a burst
+"""
+
+import threading
+import time
+
+
+class BurstAggregator:
+    """Collects frames per device until a burst is complete, then hands it off
+
+    A burst closes once burst_size frames arrived or window_seconds after its
+    first frame. A repeated frame number, or a device timestamp (millis since
+    boot) more than the window away from the burst's first one, starts a new
+    trigger. handler(device_id, frames) runs on the thread that closed the
+    burst: the ingest worker for complete bursts, a timer thread otherwise.
+    """
+
+    def __init__(self, handler, burst_size: int = 5, window_seconds: float = 8.0):
+        self.handler = handler
+        self.burst_size = burst_size
+        self.window_seconds = window_seconds
+        self.frames = 0
+        self.closed = 0
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def add(self, device_id: str, frame: dict):
+        """Add a frame dict carrying "frame_number" and "device_timestamp" (or None)"""
+        ready = []
+        now = time.monotonic()
+
+        with self._lock:
+            self.frames += 1
+            burst = self._open.get(device_id)
+            if burst is not None and self._is_new_trigger(burst, frame, now):
+                ready.append(self._close(device_id))
+                burst = None
+
+            if burst is None:
+                burst = {
+                    "frames": [],
+                    "opened": now,
+                    "device_timestamp": frame.get("device_timestamp"),
+                    "timer": None
+                }
+                timer = threading.Timer(self.window_seconds, self._expire, (device_id, burst))
+                timer.daemon = True
+                burst["timer"] = timer
+                self._open[device_id] = burst
+                timer.start()
+
+            burst["frames"].append(frame)
+            if len(burst["frames"]) >= self.burst_size:
+                ready.append(self._close(device_id))
+
+        for closed_device, frames in ready:
+            self.handler(closed_device, frames)
+
+    def flush(self):
+        """Close every open burst now (e.g. on shutdown)"""
+        with self._lock:
+            ready = [self._close(device_id) for device_id in list(self._open)]
+        for device_id, frames in ready:
+            self.handler(device_id, frames)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(burst["frames"]) for burst in self._open.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "bursts": self.closed,
+                "open": len(self._open)
+            }
+
+    def _is_new_trigger(self, burst: dict, frame: dict, now: float) -> bool:
+        if now - burst["opened"] > self.window_seconds:
+            return True
+        frame_number = frame.get("frame_number")
+        if frame_number is not None and any(f.get("frame_number") == frame_number for f in burst["frames"]):
+            return True
+        first, current = burst["device_timestamp"], frame.get("device_timestamp")
+        return first is not None and current is not None and abs(current - first) > self.window_seconds * 1000
+
+    def _close(self, device_id: str) -> tuple:
+        burst = self._open.pop(device_id)
+        burst["timer"].cancel()
+        self.closed += 1
+        return device_id, burst["frames"]
+
+    def _expire(self, device_id: str, burst: dict):
+        with self._lock:
+            if self._open.get(device_id) is not burst:
+                return
+            ready = self._close(device_id)
+        try:
+            self.handler(*ready)
+        except Exception as e:
+            print(f"Burst handler error ({device_id}): {e}")
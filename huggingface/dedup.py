@@ -0,0 +1,82 @@
+"""
+♻️ Near-Duplicate Frame Suppression
+Perceptual (difference) hashes with a per-device index of recent frames
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from PIL import Image
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """64-bit difference hash: brightness gradients of a tiny grayscale copy"""
+    small = image.resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0).convert("L")
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class FrameDeduplicator:
+    """Remembers recent frame hashes per device and matches near-duplicates
+
+    claim() registers a frame and returns a Future that the pipeline resolves
+    with its result; a later frame within max_distance bits gets that same
+    Future back instead, so a burst of near-identical frames is processed once.
+    """
+
+    def __init__(self, max_distance: int = 4, history: int = 8, ttl_seconds: float = 60.0):
+        self.max_distance = max_distance
+        self.history = history
+        self.ttl_seconds = ttl_seconds
+        self.checked = 0
+        self.suppressed = 0
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def claim(self, device_id: str, frame_hash: int) -> tuple:
+        """Returns (future, is_duplicate) for a frame from device_id"""
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            recent = self._recent.setdefault(device_id, deque(maxlen=self.history))
+            while recent and recent[0][0] < now:
+                recent.popleft()
+
+            for _, known_hash, future in reversed(recent):
+                if hamming_distance(known_hash, frame_hash) <= self.max_distance:
+                    return future, True
+
+            future = Future()
+            recent.append((now + self.ttl_seconds, frame_hash, future))
+            return future, False
+
+    def unique(self, frame_hashes: list) -> list:
+        """Indices of the frames in one burst that are not near-duplicates of an earlier one"""
+        kept = []
+        for index, frame_hash in enumerate(frame_hashes):
+            if all(hamming_distance(frame_hashes[k], frame_hash) > self.max_distance for k in kept):
+                kept.append(index)
+        with self._lock:
+            self.checked += len(frame_hashes)
+            self.suppressed += len(frame_hashes) - len(kept)
+        return kept
+
+    def mark_suppressed(self):
+        with self._lock:
+            self.suppressed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "suppressed": self.suppressed,
+                "devices": len(self._recent)
+            }
@@ -0,0 +1,206 @@
+"""
+⚙️ Inference Backends
+Export the fire model to ONNX / OpenVINO (optionally INT8), tile frames for
+high-resolution re-checks, and check parity with PyTorch
+"""
+
+import os
+import time
+
+BACKENDS = ("pytorch", "onnx", "onnx-int8", "openvino", "openvino-int8")
+
+
+def _exported_path(weights: str, backend: str) -> str:
+    stem = os.path.splitext(weights)[0]
+    return {
+        "pytorch": weights,
+        "onnx": f"{stem}.onnx",
+        "onnx-int8": f"{stem}.int8.onnx",
+        "openvino": f"{stem}_openvino_model",
+        "openvino-int8": f"{stem}_int8_openvino_model"
+    }[backend]
+
+
+def _quantize_onnx(source: str, target: str):
+    """Dynamic INT8 weight quantization, keeping the class names ultralytics reads"""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    metadata = onnx.load(source, load_external_data=False).metadata_props
+    quantized = onnx.load(target)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(metadata)
+    onnx.save(quantized, target)
+
+
+def export_model(weights: str, backend: str, imgsz: int = 640, calibration_data: str = None) -> str:
+    """Path of weights exported for backend, exporting on first use
+
+    Exports use a dynamic batch axis so burst batches keep working;
+    OpenVINO INT8 needs a calibration dataset YAML (calibration_data).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+
+    target = _exported_path(weights, backend)
+    if os.path.exists(target):
+        return target
+
+    from ultralytics import YOLO
+
+    if backend.startswith("onnx"):
+        exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if backend == "onnx-int8":
+            _quantize_onnx(exported, target)
+            exported = target
+    else:
+        options = {"int8": True, "data": calibration_data} if backend == "openvino-int8" else {}
+        exported = YOLO(weights).export(format="openvino", imgsz=imgsz, dynamic=True, **options)
+
+    if os.path.abspath(exported) != os.path.abspath(target):
+        os.replace(exported, target)
+    return target
+
+
+def load_model(weights: str, backend: str = "pytorch", imgsz: int = 640, calibration_data: str = None):
+    """Ultralytics YOLO model running on the chosen backend
+
+    Exported models return the same Results objects as PyTorch, so callers
+    parse detections the same way regardless of backend.
+    """
+    from ultralytics import YOLO
+
+    if backend == "pytorch":
+        return YOLO(weights)
+    return YOLO(export_model(weights, backend, imgsz, calibration_data), task="detect")
+
+
+def tile_windows(width: int, height: int, tile: int = 640, overlap: float = 0.2) -> list:
+    """Overlapping (left, top, right, bottom) crops covering a width x height frame"""
+    def starts(size):
+        if size <= tile:
+            return [0]
+        step = max(1, int(tile * (1 - overlap)))
+        return list(range(0, size - tile, step)) + [size - tile]
+
+    return [
+        (left, top, min(left + tile, width), min(top + tile, height))
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+
+def merge_results(base, tile_results: list = (), windows: list = (), iou: float = 0.5, min_confidence: float = 0.25):
+    """Merge a full-frame result with tile results (shifted by their windows)
+
+    Boxes below min_confidence are dropped and the rest go through class-wise
+    NMS. Returns a new ultralytics result on the full frame, so plot() and the
+    usual parsing keep working.
+    """
+    import torch
+    from torchvision.ops import batched_nms
+
+    boxes = [base.boxes.data]
+    for result, (left, top, _, _) in zip(tile_results, windows):
+        shifted = result.boxes.data.clone().to(base.boxes.data.device)
+        shifted[:, [0, 2]] += left
+        shifted[:, [1, 3]] += top
+        boxes.append(shifted)
+
+    merged = torch.cat(boxes)
+    merged = merged[merged[:, 4] >= min_confidence]
+    keep = batched_nms(merged[:, :4], merged[:, 4], merged[:, 5].long(), iou)
+
+    fused = base.new()
+    fused.update(boxes=merged[keep])
+    return fused
+
+
+def _iou(a: list, b: list) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare_detections(reference: dict, candidate: dict, iou_threshold: float = 0.5) -> dict:
+    """Match two detection dicts box by box (same class, IoU >= iou_threshold)"""
+    unmatched = list(candidate["detections"])
+    matched = 0
+    confidence_error = 0.0
+
+    for box in reference["detections"]:
+        best = max(
+            (other for other in unmatched if other["class"] == box["class"]),
+            key=lambda other: _iou(box["bbox"], other["bbox"]),
+            default=None
+        )
+        if best is not None and _iou(box["bbox"], best["bbox"]) >= iou_threshold:
+            unmatched.remove(best)
+            matched += 1
+            confidence_error = max(confidence_error, abs(box["confidence"] - best["confidence"]))
+
+    return {
+        "flags_match": (
+            reference["fire_detected"] == candidate["fire_detected"]
+            and reference["smoke_detected"] == candidate["smoke_detected"]
+        ),
+        "matched": matched,
+        "missed": len(reference["detections"]) - matched,
+        "extra": len(unmatched),
+        "max_confidence_error": round(confidence_error, 3)
+    }
+
+
+def parity_check(reference_model, candidate_model, images: list, parse, iou_threshold: float = 0.5) -> dict:
+    """Run both models on the same images and summarize how far they disagree
+
+    parse turns one ultralytics result into (detection_result, annotated).
+    """
+    report = {"images": len(images), "flag_mismatches": 0, "matched": 0, "missed": 0, "extra": 0,
+              "max_confidence_error": 0.0, "reference_ms": 0.0, "candidate_ms": 0.0}
+
+    for image in images:
+        started = time.perf_counter()
+        reference = parse(reference_model(image, verbose=False)[0])[0]
+        report["reference_ms"] += (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        candidate = parse(candidate_model(image, verbose=False)[0])[0]
+        report["candidate_ms"] += (time.perf_counter() - started) * 1000
+
+        comparison = compare_detections(reference, candidate, iou_threshold)
+        report["flag_mismatches"] += not comparison["flags_match"]
+        for key in ("matched", "missed", "extra"):
+            report[key] += comparison[key]
+        report["max_confidence_error"] = max(report["max_confidence_error"], comparison["max_confidence_error"])
+
+    for key in ("reference_ms", "candidate_ms"):
+        report[key] = round(report[key] / max(len(images), 1), 1)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+    import json
+
+    from PIL import Image
+
+    from app import _parse_yolo_result
+
+    parser = argparse.ArgumentParser(description="Export the fire model and compare it with PyTorch")
+    parser.add_argument("images", help="Directory of sample frames (*.jpg)")
+    parser.add_argument("--weights", default="fire_n.pt")
+    parser.add_argument("--backend", default="onnx", choices=BACKENDS[1:])
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--calibration-data", default=None, help="Dataset YAML for OpenVINO INT8")
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+
+    frames = [Image.open(path).convert("RGB") for path in sorted(glob.glob(os.path.join(args.images, "*.jpg")))]
+    reference_model = load_model(args.weights, "pytorch")
+    candidate_model = load_model(args.weights, args.backend, args.imgsz, args.calibration_data)
+    print(json.dumps(parity_check(reference_model, candidate_model, frames, _parse_yolo_result, args.iou), indent=2))
@@ -0,0 +1,321 @@
+"""
+📡 ESP32 Ingest Server
+Accepts frames POSTed by hardware/esp.ino and hands them to pipeline workers
+"""
+
+import base64
+import binascii
+import heapq
+import hmac
+import itertools
+import json
+import math
+import threading
+import time
+import uuid
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+
+class IngestQueue:
+    """Bounded risk-ordered job queue drained by a fixed pool of pipeline workers
+
+    priority(job) returns a risk in [0, 1] (None = 0.5). Jobs are served by
+    arrival time minus risk * aging_seconds, so a riskier frame jumps ahead
+    by up to aging_seconds but nothing waits behind newer work forever.
+    Under overload, jobs below high_risk may only fill the queue up to
+    (1 - reserve) of max_size, and those picked up while the queue is at
+    least degrade_depth full are marked job["degraded"].
+    """
+
+    def __init__(
+        self,
+        handler,
+        num_workers: int = 2,
+        max_size: int = 32,
+        priority=None,
+        aging_seconds: float = 10.0,
+        high_risk: float = 0.5,
+        reserve: float = 0.25,
+        degrade_depth: float = 0.5
+    ):
+        self.handler = handler
+        self.priority = priority
+        self.num_workers = max(1, num_workers)
+        self.max_size = max_size
+        self.aging_seconds = aging_seconds
+        self.high_risk = high_risk
+        self.reserve = reserve
+        self.degrade_depth = degrade_depth
+        self.threads = []
+        self.accepting = False
+        self.avg_job_seconds = 1.0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.shed = 0
+        self.degraded = 0
+        self._lock = threading.Lock()
+        self._heap = []
+        self._order = itertools.count()
+        self._ready = threading.Condition()
+
+    def start(self):
+        """Spawn the worker threads and start accepting jobs"""
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"ingest-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        self.accepting = True
+
+    def stop(self, timeout: float = 10.0):
+        """Stop accepting jobs and let workers drain the queue"""
+        self.accepting = False
+        with self._ready:
+            for _ in self.threads:
+                # Sort after every queued job so the backlog drains first
+                heapq.heappush(self._heap, (math.inf, next(self._order), None))
+            self._ready.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def submit(self, job: dict) -> bool:
+        """Enqueue a job without blocking, returns False when the queue is full"""
+        risk = self.priority(job) if self.priority else None
+        job["risk"] = 0.5 if risk is None else risk
+        low_risk = job["risk"] < self.high_risk
+        limit = int(self.max_size * (1 - self.reserve)) if low_risk else self.max_size
+
+        with self._ready:
+            accepted = len(self._heap) < limit
+            if accepted:
+                key = time.monotonic() - job["risk"] * self.aging_seconds
+                heapq.heappush(self._heap, (key, next(self._order), job))
+                self._ready.notify()
+
+        if not accepted:
+            with self._lock:
+                self.rejected += 1
+                self.shed += low_risk
+        return accepted
+
+    def depth(self) -> int:
+        with self._ready:
+            return len(self._heap)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        backlog = self.depth() + 1
+        return max(1, math.ceil(backlog * self.avg_job_seconds / self.num_workers))
+
+    def _worker(self):
+        while True:
+            with self._ready:
+                while not self._heap:
+                    self._ready.wait()
+                _, _, job = heapq.heappop(self._heap)
+                backlog = len(self._heap)
+            if job is None:
+                return
+
+            job["degraded"] = job["risk"] < self.high_risk and backlog >= self.degrade_depth * self.max_size
+            if job["degraded"]:
+                with self._lock:
+                    self.degraded += 1
+
+            started = time.perf_counter()
+            try:
+                self.handler(job)
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                print(f"Ingest job {job.get('job_id')} error: {e}")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    # Exponential moving average used for Retry-After hints
+                    self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * elapsed
+                if job.get("release"):
+                    # Drop our view before the receive buffer goes back to the pool;
+                    # a timed-out stage may still be reading it, then let GC have it
+                    try:
+                        if isinstance(job["image_bytes"], memoryview):
+                            job["image_bytes"].release()
+                        job["release"]()
+                    except BufferError:
+                        pass
+
+
+class BufferPool:
+    """Recycles receive buffers for binary uploads so each frame avoids a fresh allocation"""
+
+    def __init__(self, buffer_size: int = 256 * 1024, max_buffers: int = 64):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int = 0) -> bytearray:
+        with self._lock:
+            for index, buffer in enumerate(self._free):
+                if len(buffer) >= size:
+                    return self._free.pop(index)
+        return bytearray(max(size, self.buffer_size))
+
+    def release(self, buffer: bytearray):
+        with self._lock:
+            if len(self._free) < self.max_buffers:
+                self._free.append(buffer)
+
+
+async def _read_into_buffer(chunks, pool: BufferPool, size_hint: int, max_bytes: int) -> tuple:
+    """Stream an async chunk iterator into a pooled buffer, returns (buffer, length)"""
+    buffer = pool.acquire(size_hint)
+    length = 0
+    async for chunk in chunks:
+        end = length + len(chunk)
+        if end > max_bytes:
+            pool.release(buffer)
+            raise ValueError(f"Upload exceeds {max_bytes} bytes")
+        if end > len(buffer):
+            # Grow into a fresh buffer; resizing in place would break exported views
+            grown = bytearray(max(end, 2 * len(buffer)))
+            grown[:length] = buffer[:length]
+            pool.release(buffer)
+            buffer = grown
+        buffer[length:end] = chunk
+        length = end
+    return buffer, length
+
+
+async def _upload_chunks(upload, chunk_size: int = 64 * 1024):
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _error(status_code: int, message: str, retry_after: int = None) -> JSONResponse:
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "error", "message": message},
+        headers=headers
+    )
+
+
+def _parse_sensors(value):
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def create_ingest_router(
+    ingest_queue: IngestQueue,
+    api_key: str = "",
+    buffer_pool: BufferPool = None,
+    max_upload_bytes: int = 4 * 1024 * 1024
+) -> APIRouter:
+    """Build the /api/upload-image route used by the ESP32-CAM firmware
+
+    Accepts the firmware's base64 JSON body, a raw image/jpeg body (metadata
+    in X-Frame-Number / X-Timestamp headers) or a multipart form with an
+    "image" file part.
+    """
+    router = APIRouter()
+    buffer_pool = buffer_pool or BufferPool()
+
+    async def read_json(request: Request) -> tuple:
+        payload = await request.json()
+        image_bytes = base64.b64decode(payload["imageData"], validate=True)
+        return payload, image_bytes, None
+
+    async def read_jpeg(request: Request) -> tuple:
+        size_hint = int(request.headers.get("Content-Length") or 0)
+        if size_hint > max_upload_bytes:
+            raise ValueError(f"Upload exceeds {max_upload_bytes} bytes")
+        buffer, length = await _read_into_buffer(
+            request.stream(), buffer_pool, size_hint, max_upload_bytes
+        )
+        payload = {
+            "frameNumber": request.headers.get("X-Frame-Number"),
+            "timestamp": request.headers.get("X-Timestamp"),
+            "imageSize": request.headers.get("X-Image-Size")
+        }
+        return payload, memoryview(buffer)[:length], buffer
+
+    async def read_multipart(request: Request) -> tuple:
+        form = await request.form()
+        upload = form["image"]
+        buffer, length = await _read_into_buffer(
+            _upload_chunks(upload), buffer_pool, upload.size or 0, max_upload_bytes
+        )
+        payload = {key: value for key, value in form.items() if key != "image"}
+        payload["sensors"] = _parse_sensors(payload.get("sensors"))
+        return payload, memoryview(buffer)[:length], buffer
+
+    @router.post("/api/upload-image")
+    async def upload_image(request: Request):
+        if api_key and not hmac.compare_digest(request.headers.get("X-API-Key", ""), api_key):
+            return _error(401, "Invalid API key")
+
+        if not ingest_queue.accepting:
+            return _error(503, "Ingest workers not ready", ingest_queue.retry_after())
+
+        content_type = request.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type == "image/jpeg":
+            reader = read_jpeg
+        elif content_type == "multipart/form-data":
+            reader = read_multipart
+        else:
+            reader = read_json
+
+        buffer = None
+        try:
+            payload, image_bytes, buffer = await reader(request)
+            expected_size = payload.get("imageSize")
+            if expected_size not in (None, "") and int(expected_size) != len(image_bytes):
+                raise ValueError(f"imageSize {expected_size} does not match {len(image_bytes)} received bytes")
+        except (KeyError, TypeError, ValueError, binascii.Error) as e:
+            if buffer is not None:
+                buffer_pool.release(buffer)
+            return _error(400, f"Invalid upload: {e}")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "received_at": int(time.time() * 1000),
+            "device_id": request.headers.get("X-Device-ID", "esp32-cam"),
+            "frame_number": payload.get("frameNumber"),
+            "device_timestamp": payload.get("timestamp"),
+            "image_format": payload.get("imageFormat", "jpeg"),
+            "image_bytes": image_bytes,
+            "sensors": payload.get("sensors"),
+            "latitude": payload.get("latitude"),
+            "longitude": payload.get("longitude"),
+            "release": (lambda: buffer_pool.release(buffer)) if buffer is not None else None
+        }
+
+        if not ingest_queue.submit(job):
+            if buffer is not None:
+                buffer_pool.release(buffer)
+            return _error(429, "Ingest queue full", ingest_queue.retry_after())
+
+        return JSONResponse(
+            status_code=202,
+            content={
+                "status": "queued",
+                "job_id": job["job_id"],
+                "queue_depth": ingest_queue.depth()
+            }
+        )
+
+    return router
@@ -0,0 +1,290 @@
+"""
+📶 ESP32 Fleet Load Generator
+Simulates many cameras replaying the upload protocol of hardware/esp.ino
+(5 frames per trigger, 200 ms flash + 500 ms interval, base64 JSON body,
+X-API-Key header) and reports throughput, latency percentiles and rejections.
+
+    python loadgen.py --url http://localhost:7860 --devices 200 --duration 120
+    python loadgen.py --serve --fake-model-ms 40 --devices 100 --storm-at 20   # fully local
+"""
+
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+from PIL import Image
+
+# Timing constants mirrored from hardware/esp.ino
+NUM_FRAMES = 5
+FLASH_MS = 200
+FRAME_INTERVAL_MS = 500
+DEBOUNCE_SECONDS = 10
+HTTP_TIMEOUT = 5.0  # ESP32 HTTPClient default
+
+
+def load_corpus(directory: str = None, size: tuple = (800, 600), count: int = 20) -> list:
+    """JPEG bytes to replay: files from directory, or synthetic frames"""
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "*.jpg")) + glob.glob(os.path.join(directory, "*.jpeg")))
+        if not paths:
+            raise SystemExit(f"No JPEG files in {directory}")
+        frames = []
+        for path in paths:
+            with open(path, "rb") as f:
+                frames.append(f.read())
+        return frames
+
+    frames = []
+    for _ in range(count):
+        pixels = np.random.randint(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=80)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+class Recorder:
+    """Thread-safe log of (latency_ms, status) per upload"""
+
+    def __init__(self):
+        self.samples = []
+        self.triggers = 0
+        self.missed_triggers = 0
+        self._lock = threading.Lock()
+
+    def add(self, latency_ms: float, status):
+        with self._lock:
+            self.samples.append((latency_ms, status))
+
+    def count_trigger(self, missed: bool = False):
+        with self._lock:
+            if missed:
+                self.missed_triggers += 1
+            else:
+                self.triggers += 1
+
+    def report(self, duration: float) -> dict:
+        with self._lock:
+            samples = list(self.samples)
+
+        statuses = {}
+        for _, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        def percentiles(values):
+            if not values:
+                return {}
+            return {f"p{q}": round(float(np.percentile(values, q)), 1) for q in (50, 95, 99)}
+
+        total = len(samples)
+        accepted = statuses.get("202", 0)
+        return {
+            "duration_s": round(duration, 1),
+            "triggers": self.triggers,
+            "missed_triggers": self.missed_triggers,
+            "requests": total,
+            "requests_per_second": round(total / duration, 2) if duration else 0.0,
+            "accepted_per_second": round(accepted / duration, 2) if duration else 0.0,
+            "rejection_rate": round(statuses.get("429", 0) / total, 3) if total else 0.0,
+            "error_rate": round(sum(n for s, n in statuses.items() if not s.startswith("2") and s != "429") / total, 3) if total else 0.0,
+            "statuses": statuses,
+            "latency_ms": percentiles([latency for latency, _ in samples]),
+            "accepted_latency_ms": percentiles([latency for latency, status in samples if status == 202])
+        }
+
+
+class SimulatedCamera(threading.Thread):
+    """One ESP32-CAM: waits for its trigger times and uploads a 5-frame burst each"""
+
+    def __init__(self, device_id: str, url: str, api_key: str, corpus: list, triggers: list,
+                 recorder: Recorder, started: float, binary: bool = False, jitter_ms: float = 0):
+        super().__init__(name=device_id, daemon=True)
+        self.device_id = device_id
+        self.url = url
+        self.api_key = api_key
+        self.corpus = corpus
+        self.triggers = triggers
+        self.recorder = recorder
+        self.started = started
+        self.binary = binary
+        self.jitter_ms = jitter_ms
+        # millis() on the device: time since its (simulated) boot
+        self.boot = started - random.uniform(60, 3600)
+
+    def run(self):
+        last_trigger = -DEBOUNCE_SECONDS
+        for offset in self.triggers:
+            delay = self.started + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.time() - self.started
+            if now - last_trigger <= DEBOUNCE_SECONDS:
+                self.recorder.count_trigger(missed=True)
+                continue
+            last_trigger = now
+            self.recorder.count_trigger()
+            self.capture_burst()
+
+    def capture_burst(self):
+        for frame_number in range(1, NUM_FRAMES + 1):
+            self._sleep_ms(FLASH_MS)
+            self.upload(frame_number, random.choice(self.corpus))
+            if frame_number < NUM_FRAMES:
+                self._sleep_ms(FRAME_INTERVAL_MS)
+
+    def upload(self, frame_number: int, jpeg: bytes):
+        millis = str(int((time.time() - self.boot) * 1000))
+        headers = {"X-API-Key": self.api_key, "X-Device-ID": self.device_id}
+        if self.binary:
+            headers.update({
+                "Content-Type": "image/jpeg",
+                "X-Frame-Number": str(frame_number),
+                "X-Timestamp": millis,
+                "X-Image-Size": str(len(jpeg))
+            })
+            body = jpeg
+        else:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps({
+                "frameNumber": frame_number,
+                "timestamp": int(millis),
+                "imageFormat": "jpeg",
+                "imageSize": len(jpeg),
+                "imageData": base64.b64encode(jpeg).decode("ascii")
+            }).encode()
+
+        request = urllib.request.Request(f"{self.url}/api/upload-image", data=body, headers=headers, method="POST")
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (socket.timeout, TimeoutError):
+            status = "timeout"
+        except (urllib.error.URLError, ConnectionError):
+            status = "connection_error"
+        self.recorder.add((time.perf_counter() - started) * 1000, status)
+
+    def _sleep_ms(self, milliseconds: float):
+        time.sleep(max(0.0, milliseconds + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+
+def trigger_schedule(args) -> list:
+    """Trigger offsets (seconds) per device: Poisson background plus an optional storm"""
+    schedules = []
+    for _ in range(args.devices):
+        offsets = []
+        if args.trigger_interval > 0:
+            offset = random.expovariate(1 / args.trigger_interval)
+            while offset < args.duration:
+                offsets.append(offset)
+                offset += random.expovariate(1 / args.trigger_interval)
+        if args.storm_at is not None and random.random() < args.storm_fraction:
+            offsets.append(args.storm_at + random.uniform(0, args.storm_spread))
+        schedules.append(sorted(offsets))
+    return schedules
+
+
+def serve_locally(args) -> str:
+    """Start the ingest server in-process on the benchmark fakes, returns its URL"""
+    import uvicorn
+
+    import app
+    import benchmark
+
+    benchmark.install_fakes(args)
+    app.INGEST_API_KEY = args.api_key
+    server = app.create_server(mount_ui=False)
+    app.ingest_queue.start()
+
+    uvicorn_server = uvicorn.Server(uvicorn.Config(server, host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=uvicorn_server.run, name="loadgen-server", daemon=True).start()
+    while not uvicorn_server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{args.port}"
+
+
+def drain_local_pipeline(timeout: float = 120.0) -> dict:
+    """Wait for the in-process queue and bursts to settle, then return pipeline counters"""
+    import app
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if app.ingest_queue.depth() == 0 and app.burst_aggregator.pending() == 0:
+            break
+        time.sleep(0.2)
+    # Let in-flight jobs finish and burst timers fire
+    time.sleep(app.BURST_WINDOW + 1)
+    stats = app.pipeline_stats()
+    stats["incidents"] = sum(1 for key in app.db.data if key.count("/") == 1 and key.startswith("incidents/"))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate an ESP32-CAM fleet against the ingest endpoint")
+    parser.add_argument("--url", default="http://localhost:7860")
+    parser.add_argument("--api-key", default=os.environ.get("INGEST_API_KEY", ""))
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds during which triggers are scheduled")
+    parser.add_argument("--trigger-interval", type=float, default=60,
+                        help="Mean seconds between triggers per device (0 = storm only)")
+    parser.add_argument("--storm-at", type=float, default=None, help="Second at which a trigger storm starts")
+    parser.add_argument("--storm-fraction", type=float, default=1.0, help="Share of devices triggered by the storm")
+    parser.add_argument("--storm-spread", type=float, default=2.0, help="Seconds over which storm triggers arrive")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Random +/- jitter on firmware delays")
+    parser.add_argument("--binary", action="store_true", help="Send raw image/jpeg bodies (USE_BINARY_UPLOAD)")
+    parser.add_argument("--images", help="Directory of JPEG frames to replay (default: synthetic)")
+    parser.add_argument("--size", default="800x600", help="Synthetic frame size")
+    parser.add_argument("--serve", action="store_true", help="Run the app in-process on local fakes")
+    parser.add_argument("--port", type=int, default=7861, help="Port for --serve")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args, _ = parser.parse_known_args()
+    if args.serve:
+        # The fake-backend flags (latencies, --fake-model-ms) only apply in-process
+        import benchmark
+        benchmark.add_fake_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+
+    url = serve_locally(args) if args.serve else args.url.rstrip("/")
+    corpus = load_corpus(args.images, tuple(int(part) for part in args.size.lower().split("x")))
+    recorder = Recorder()
+    started = time.time() + 1.0
+    cameras = [
+        SimulatedCamera(f"sim-{index:04d}", url, args.api_key, corpus, schedule, recorder,
+                        started, args.binary, args.jitter_ms)
+        for index, schedule in enumerate(trigger_schedule(args))
+    ]
+    for camera in cameras:
+        camera.start()
+    for camera in cameras:
+        camera.join()
+
+    report = recorder.report(time.time() - started)
+    if args.serve:
+        report["pipeline"] = drain_local_pipeline()
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
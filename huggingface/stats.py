@@ -0,0 +1,82 @@
+"""
+📊 Stats Counters
+Server-side atomic increments for the `stats` and `rollups` nodes
+"""
+
+import atexit
+import threading
+
+
+def server_increment(delta: int) -> dict:
+    """Realtime Database server value that adds delta to the stored number"""
+    return {".sv": {"increment": delta}}
+
+
+def build_stats_update(deltas: dict, latest: dict = None) -> dict:
+    """Turn counter deltas into an update() payload of atomic increments
+
+    latest holds plain values (e.g. last detection time) written as-is.
+    """
+    update = {key: server_increment(delta) for key, delta in deltas.items() if delta}
+    update.update(latest or {})
+    return update
+
+
+class StatsAggregator:
+    """Coalesces stats increments in memory and flushes them as one update
+
+    A flush happens every flush_interval_ms or as soon as flush_count
+    incidents are pending, whichever comes first.
+    """
+
+    def __init__(self, get_ref, flush_interval_ms: int = 1000, flush_count: int = 50):
+        self.get_ref = get_ref
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_count = flush_count
+        self.flushes = 0
+        self._pending = {}
+        self._pending_count = 0
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, deltas: dict, latest: dict = None):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._pending[key] = self._pending.get(key, 0) + delta
+            for key, value in (latest or {}).items():
+                self._latest[key] = max(self._latest.get(key, value), value)
+            self._pending_count += 1
+            if self._thread is None:
+                self._start()
+            if self._pending_count >= self.flush_count:
+                self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            deltas, latest = self._pending, self._latest
+            self._pending, self._pending_count, self._latest = {}, 0, {}
+
+        update = build_stats_update(deltas, latest)
+        if not update:
+            return
+
+        try:
+            self.get_ref().update(update)
+            self.flushes += 1
+        except Exception as e:
+            print(f"Stats flush error: {e}")
+            # Put the counts back so the next flush retries them
+            self.add(deltas, latest)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="stats-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
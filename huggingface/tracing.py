@@ -0,0 +1,170 @@
+"""
+🔭 Tracing & Metrics
+Per-stage timing spans tied to a request/incident and a Prometheus text endpoint
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Spans recorded for one request; stages on other threads append here too"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.attributes = {}
+        self.spans = []
+        self.started = time.time()
+        self.duration_ms = None
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, started: float, duration_ms: float, error: str = None):
+        span = {"stage": stage, "offset_ms": round((started - self.started) * 1000, 1), "duration_ms": round(duration_ms, 1)}
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                **self.attributes,
+                "started": int(self.started * 1000),
+                "duration_ms": self.duration_ms,
+                "spans": list(self.spans)
+            }
+
+
+class Tracer:
+    """Stage spans, latency histograms and error counters for the pipeline
+
+    span(stage) times a block, files it under the current trace and the
+    stage histogram, and counts it as an error when it raises. Work handed
+    to thread pools keeps its trace when submitted through submit().
+    """
+
+    def __init__(self, slow_ms: float = 0, history: int = 100, buckets: tuple = DEFAULT_BUCKETS):
+        self.slow_ms = slow_ms
+        self.buckets = buckets
+        self._recent = deque(maxlen=history)
+        self._histograms = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, trace_id: str = None, **attributes):
+        """Start a trace for one request (a nested call starts a separate trace)"""
+        trace = Trace(trace_id or uuid.uuid4().hex)
+        trace.attributes.update(attributes)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration_ms = round((time.time() - trace.started) * 1000, 1)
+            with self._lock:
+                self._recent.append(trace)
+            if self.slow_ms and trace.duration_ms >= self.slow_ms:
+                stages = ", ".join(f"{span['stage']} {span['duration_ms']:.0f}ms" for span in trace.spans)
+                print(f"Slow trace {trace.trace_id} {trace.attributes} {trace.duration_ms:.0f}ms: {stages}")
+
+    def annotate(self, **attributes):
+        """Attach attributes (e.g. incident_id) to the current trace, if any"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attributes.update(attributes)
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.time()
+        perf_started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            elapsed = time.perf_counter() - perf_started
+            self.observe(stage, elapsed, error is not None)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.add_span(stage, started, elapsed * 1000, error)
+
+    def submit(self, executor, fn, *args, **kwargs):
+        """executor.submit() that runs fn inside the caller's trace context"""
+        return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def observe(self, stage: str, seconds: float, failed: bool = False):
+        with self._lock:
+            histogram = self._histograms.setdefault(stage, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+            if failed:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def error(self, stage: str):
+        """Count a failure that was handled without raising through a span"""
+        with self._lock:
+            self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def recent(self, limit: int = 20) -> list:
+        with self._lock:
+            traces = list(self._recent)[-limit:]
+        return [trace.to_dict() for trace in reversed(traces)]
+
+    def render_metrics(self, gauges: dict = None, prefix: str = "wildfire") -> str:
+        """Prometheus text exposition: stage histograms, error counters and gauges
+
+        gauges is a (possibly nested) dict of numbers, e.g. pipeline_stats();
+        nested keys are joined with underscores.
+        """
+        lines = [
+            f"# HELP {prefix}_stage_seconds Pipeline stage latency",
+            f"# TYPE {prefix}_stage_seconds histogram"
+        ]
+        with self._lock:
+            histograms = {stage: dict(h, buckets=list(h["buckets"])) for stage, h in self._histograms.items()}
+            errors = dict(self._errors)
+
+        for stage, histogram in sorted(histograms.items()):
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+        lines += [
+            f"# HELP {prefix}_stage_errors_total Pipeline stage failures",
+            f"# TYPE {prefix}_stage_errors_total counter"
+        ]
+        for stage, count in sorted(errors.items()):
+            lines.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {count}')
+
+        for name, value in sorted(_flatten(gauges or {}, prefix).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(values: dict, prefix: str) -> dict:
+    flat = {}
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (bool, int, float)):
+            flat[name] = float(value)
+    return flat
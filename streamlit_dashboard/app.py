@@ -3,10 +3,11 @@
 """
 
 import streamlit as st
-from utils.firebase_client import init_firebase, get_incidents, get_stats, get_devices
+from utils.firebase_client import init_firebase, get_snapshot, frame_to_records
+from utils.geo import cluster_incidents, filter_incidents
 from utils.helpers import format_timestamp, get_severity_emoji, format_value, get_current_time_ist
-import pandas as pd
 import plotly.express as px
+import time
 
 # ============ PAGE CONFIG ============
 st.set_page_config(
@@ -16,13 +17,23 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Map time window options (hours, None = all time)
+MAP_TIME_WINDOWS = {
+    "All Time": None,
+    "Last 24 Hours": 24,
+    "Last 7 Days": 24 * 7,
+    "Last 30 Days": 24 * 30
+}
+
 # ============ INIT ============
 init_firebase()
 
 # ============ LOAD DATA ============
-incidents = get_incidents()
-stats = get_stats()
-devices = get_devices()
+# One consistent snapshot per rerun from the shared, listener-backed store
+snapshot = get_snapshot()
+incidents = snapshot["incidents"]
+stats = snapshot["stats"]
+devices = snapshot["devices"]
 
 # ============ SIDEBAR ============
 with st.sidebar:
@@ -31,8 +42,8 @@ with st.sidebar:
     
     st.markdown("---")
     
+    # Data is pushed by the realtime listener; a rerun just reads the latest snapshot
     if st.button("🔄 Refresh Data", width="stretch"):
-        st.cache_data.clear()
         st.rerun()
     
     st.markdown("---")
@@ -78,15 +89,16 @@ with col5:
 st.markdown("---")
 
 # ============ FILTER INCIDENTS ============
+# incidents is a typed frame (newest first); filters are vectorized column masks
 filtered_incidents = incidents
 
 if severity_filter:
-    filtered_incidents = [i for i in filtered_incidents if i.get("severity", "").upper() in severity_filter]
+    filtered_incidents = filtered_incidents[filtered_incidents["severity"].isin(severity_filter)]
 
 if status_filter == "Confirmed":
-    filtered_incidents = [i for i in filtered_incidents if i.get("status") == "confirmed"]
+    filtered_incidents = filtered_incidents[filtered_incidents["status"] == "confirmed"]
 elif status_filter == "False Alarm":
-    filtered_incidents = [i for i in filtered_incidents if i.get("status") == "false_alarm"]
+    filtered_incidents = filtered_incidents[filtered_incidents["status"] == "false_alarm"]
 
 # ============ MAP & RECENT INCIDENTS ============
 map_col, list_col = st.columns([3, 2])
@@ -94,59 +106,88 @@ map_col, list_col = st.columns([3, 2])
 with map_col:
     st.subheader("🗺️ Incident Map")
     
-    # Get valid incidents with coordinates
-    valid_incidents = [
-        i for i in filtered_incidents 
-        if i.get("latitude", 0) != 0 and i.get("longitude", 0) != 0
-    ]
+    zoom_col, window_col = st.columns(2)
+    with zoom_col:
+        map_zoom = st.slider("Zoom", min_value=2, max_value=16, value=8)
+    with window_col:
+        time_window = st.selectbox("Time Window", list(MAP_TIME_WINDOWS))
+    
+    # Get valid incidents with coordinates inside the time window
+    window_hours = MAP_TIME_WINDOWS[time_window]
+    start_ms = int((time.time() - window_hours * 3600) * 1000) if window_hours else None
+    map_incidents = filter_incidents(filtered_incidents, start_ms=start_ms)
+    valid_incidents = frame_to_records(map_incidents.head(5))
     
     if valid_incidents:
+        # Incidents are aggregated per geohash cell here; only clusters reach the browser
+        clusters = cluster_incidents(map_incidents, map_zoom)
+        fig = px.scatter_mapbox(
+            clusters,
+            lat="latitude",
+            lon="longitude",
+            size="count",
+            color="severity",
+            color_discrete_map={
+                "CRITICAL": "#FF0000",
+                "HIGH": "#FF6600",
+                "MEDIUM": "#FFCC00",
+                "LOW": "#00CC00",
+                "UNKNOWN": "#999999"
+            },
+            hover_data={"count": True, "cell": True, "latitude": ":.4f", "longitude": ":.4f"},
+            size_max=40,
+            zoom=map_zoom,
+            height=400
+        )
+        fig.update_layout(mapbox_style="open-street-map", margin={"r": 0, "t": 0, "l": 0, "b": 0})
+        st.plotly_chart(fig, width="stretch")
+        st.caption(f"{len(map_incidents)} incidents in {len(clusters)} map clusters")
+        
         api_key = st.secrets.get("GOOGLE_MAPS_API_KEY", "")
         
         if api_key:
-            # Use first incident location
-            latest_incident = valid_incidents[0]
-            lat = latest_incident["latitude"]
-            lng = latest_incident["longitude"]
-            
-            # Google Maps Embed with place marker
-            embed_url = f"https://www.google.com/maps/embed/v1/place?key={api_key}&q={lat},{lng}&zoom=15&maptype=satellite"
-            
-            # Display embedded map with marker
-            st.markdown(
-                f"""
-                <iframe 
-                    width="100%" 
-                    height="400" 
-                    style="border:0; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.2);" 
-                    loading="lazy" 
-                    allowfullscreen 
-                    referrerpolicy="no-referrer-when-downgrade"
-                    src="{embed_url}">
-                </iframe>
-                """,
-                unsafe_allow_html=True
-            )
-            
-            # Incident list below map
-            st.markdown("#### 📍 Incident Locations")
-            for inc in valid_incidents[:5]:
-                sev = inc.get("severity", "UNKNOWN")
-                emoji = get_severity_emoji(sev)
-                inc_lat = inc.get("latitude", 0)
-                inc_lng = inc.get("longitude", 0)
-                maps_link = f"https://www.google.com/maps?q={inc_lat},{inc_lng}&z=15"
-                st.markdown(f"{emoji} **{sev}** - [{inc_lat:.4f}°N, {inc_lng:.4f}°E]({maps_link})")
-        else:
-            st.error("⚠️ Google Maps API key not found!")
+            with st.expander("🛰️ Satellite View - Latest Incident"):
+                # Use first incident location
+                latest_incident = valid_incidents[0]
+                lat = latest_incident["latitude"]
+                lng = latest_incident["longitude"]
+                
+                # Google Maps Embed with place marker
+                embed_url = f"https://www.google.com/maps/embed/v1/place?key={api_key}&q={lat},{lng}&zoom=15&maptype=satellite"
+                
+                # Display embedded map with marker
+                st.markdown(
+                    f"""
+                    <iframe 
+                        width="100%" 
+                        height="400" 
+                        style="border:0; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.2);" 
+                        loading="lazy" 
+                        allowfullscreen 
+                        referrerpolicy="no-referrer-when-downgrade"
+                        src="{embed_url}">
+                    </iframe>
+                    """,
+                    unsafe_allow_html=True
+                )
+        
+        # Incident list below map
+        st.markdown("#### 📍 Incident Locations")
+        for inc in valid_incidents:
+            sev = inc.get("severity", "UNKNOWN")
+            emoji = get_severity_emoji(sev)
+            inc_lat = inc.get("latitude", 0)
+            inc_lng = inc.get("longitude", 0)
+            maps_link = f"https://www.google.com/maps?q={inc_lat},{inc_lng}&z=15"
+            st.markdown(f"{emoji} **{sev}** - [{inc_lat:.4f}°N, {inc_lng:.4f}°E]({maps_link})")
     else:
         st.info("📍 No incidents with valid coordinates to display")
 
 with list_col:
     st.subheader("📋 Recent Incidents")
     
-    if filtered_incidents:
-        for inc in filtered_incidents[:5]:
+    if not filtered_incidents.empty:
+        for inc in frame_to_records(filtered_incidents.head(5)):
             severity = inc.get("severity", "UNKNOWN")
             emoji = get_severity_emoji(severity)
             status = inc.get("status", "unknown")
@@ -171,8 +212,9 @@ with list_col:
 {inc.get("action", "N/A")}
 """)
                 
-                if inc.get("annotated_url"):
-                    st.image(inc["annotated_url"], caption="Detection Result", width="stretch")
+                if inc.get("annotated_thumbnail_url"):
+                    st.image(inc["annotated_thumbnail_url"], caption="Detection Result")
+                    st.markdown(f"[🔍 Full resolution]({inc['annotated_url']})")
     else:
         st.info("No incidents match the current filters")
 
@@ -216,40 +258,38 @@ with chart_col1:
 with chart_col2:
     st.markdown("#### Incidents Timeline")
     
-    if incidents:
-        df = pd.DataFrame(incidents)
-        if "timestamp" in df.columns and len(df) > 0:
-            df["date"] = pd.to_datetime(df["timestamp"], unit="ms").dt.date
-            daily_counts = df.groupby("date").size().reset_index(name="count")
-            
-            if len(daily_counts) > 0:
-                fig = px.bar(
-                    daily_counts,
-                    x="date",
-                    y="count",
-                    color_discrete_sequence=["#FF6B35"]
-                )
-                fig.update_layout(
-                    margin={"r": 0, "t": 0, "l": 0, "b": 0},
-                    height=300,
-                    xaxis_title="Date",
-                    yaxis_title="Incidents"
-                )
-                st.plotly_chart(fig, width="stretch")
-            else:
-                st.info("Not enough data for timeline")
-        else:
-            st.info("No timestamp data")
+    # Daily buckets are maintained at write time; data written before rollups
+    # existed falls back to grouping the incident frame
+    daily_rollups = snapshot["daily_rollups"]
+    if not daily_rollups.empty:
+        daily_counts = daily_rollups[["date", "total"]].rename(columns={"total": "count"})
+    else:
+        daily_counts = incidents.groupby("date").size().reset_index(name="count")
+    
+    if len(daily_counts) > 0:
+        fig = px.bar(
+            daily_counts,
+            x="date",
+            y="count",
+            color_discrete_sequence=["#FF6B35"]
+        )
+        fig.update_layout(
+            margin={"r": 0, "t": 0, "l": 0, "b": 0},
+            height=300,
+            xaxis_title="Date",
+            yaxis_title="Incidents"
+        )
+        st.plotly_chart(fig, width="stretch")
     else:
         st.info("No data for timeline chart")
 
 st.markdown("---")
 
 # ============ LATEST DETECTION DETAIL ============
-if filtered_incidents:
+if not filtered_incidents.empty:
     st.subheader("🔥 Latest Detection Details")
     
-    latest = filtered_incidents[0]
+    latest = frame_to_records(filtered_incidents.head(1))[0]
     
     detail_col1, detail_col2, detail_col3 = st.columns([1, 1, 1])
     
@@ -277,15 +317,18 @@ if filtered_incidents:
     # Images
     img_col1, img_col2 = st.columns(2)
     
+    # Mid-size previews on the page; full resolution only when opened
     with img_col1:
         if latest.get("original_url"):
             st.markdown("#### 📷 Original Image")
-            st.image(latest["original_url"], width="stretch")
+            st.image(latest["original_preview_url"], width="stretch")
+            st.markdown(f"[🔍 Full resolution]({latest['original_url']})")
     
     with img_col2:
         if latest.get("annotated_url"):
             st.markdown("#### 🎯 Detection Result")
-            st.image(latest["annotated_url"], width="stretch")
+            st.image(latest["annotated_preview_url"], width="stretch")
+            st.markdown(f"[🔍 Full resolution]({latest['annotated_url']})")
     
     # Full Analysis
     st.markdown("#### 📝 Full Analysis")
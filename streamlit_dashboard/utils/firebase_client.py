@@ -2,6 +2,29 @@ import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, db
 import json
+import functools
+import pandas as pd
+from utils.geo import bbox_cells, filter_incidents, geohash_encode
+import threading
+import time
+SEVERITY_LEVELS = ["CRITICAL", "HIGH", "MEDIUM", "LOW", "UNKNOWN"]
+INCIDENT_COLUMNS = [
+    "id", "device_id", "timestamp", "updated_at", "status",
+    "latitude", "longitude", "geohash",
+    "temperature", "humidity", "gas_level", "flame_detected",
+    "fire_detected", "smoke_detected", "confidence", "detections",
+    "severity", "summary", "action",
+    "original_url", "annotated_url",
+    "original_preview_url", "annotated_preview_url", "annotated_thumbnail_url",
+]
+DEFAULT_STATS = {
+    "total_incidents": 0,
+    "critical_count": 0,
+    "high_count": 0,
+    "medium_count": 0,
+    "low_count": 0,
+    "last_detection": None
+}
 @st.cache_resource
 def init_firebase():
     """Initialize Firebase connection"""
@@ -22,71 +45,164 @@ def safe_get(data, *keys, default=None):
         if data is None:
             return default
     return data
-@st.cache_data(ttl=5)
-def get_incidents():
-    """Fetch all incidents from Firebase"""
-    raw_incidents = db.reference("incidents").get() or {}
-    
-    incidents = []
-    for incident_id, data in raw_incidents.items():
-        # Skip placeholder and template entries
-        if incident_id.startswith("_") or incident_id.startswith("{"):
-            continue
+def parse_incident(incident_id, data):
+    """Flatten a raw incident record into a dashboard row"""
+    latitude = safe_get(data, "location", "latitude", default=0)
+    longitude = safe_get(data, "location", "longitude", default=0)
+    original_url = safe_get(data, "images", "original_url", default="")
+    annotated_url = safe_get(data, "images", "annotated_url", default="")
+    return {
+        "id": incident_id,
+        "device_id": data.get("device_id", "Unknown"),
+        "timestamp": data.get("timestamp", 0),
+        "updated_at": data.get("updated_at", data.get("timestamp", 0)),
+        "status": data.get("status", "unknown"),
         
-        incident = {
-            "id": incident_id,
-            "device_id": data.get("device_id", "Unknown"),
-            "timestamp": data.get("timestamp", 0),
-            "status": data.get("status", "unknown"),
-            
-            # Location
-            "latitude": safe_get(data, "location", "latitude", default=0),
-            "longitude": safe_get(data, "location", "longitude", default=0),
-            
-            # Sensors
-            "temperature": safe_get(data, "sensors", "temperature"),
-            "humidity": safe_get(data, "sensors", "humidity"),
-            "gas_level": safe_get(data, "sensors", "gas_level"),
-            "flame_detected": safe_get(data, "sensors", "flame_detected", default=False),
-            
-            # Detection
-            "fire_detected": safe_get(data, "detection", "fire_detected", default=False),
-            "smoke_detected": safe_get(data, "detection", "smoke_detected", default=False),
-            "confidence": safe_get(data, "detection", "confidence", default=0),
-            "detections": safe_get(data, "detection", "detections", default=[]),
-            
-            # Analysis
-            "severity": safe_get(data, "analysis", "severity", default="UNKNOWN"),
-            "summary": safe_get(data, "analysis", "summary", default=""),
-            "action": safe_get(data, "analysis", "action", default=""),
-            
-            # Images
-            "original_url": safe_get(data, "images", "original_url", default=""),
-            "annotated_url": safe_get(data, "images", "annotated_url", default=""),
-        }
-        incidents.append(incident)
-    
-    # Sort by timestamp descending
-    incidents.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
-    return incidents
-@st.cache_data(ttl=5)
-def get_stats():
-    """Get stats from Firebase"""
-    return db.reference("stats").get() or {
-        "total_incidents": 0,
-        "critical_count": 0,
-        "high_count": 0,
-        "medium_count": 0,
-        "low_count": 0,
-        "last_detection": None
+        # Location (geohash is computed here for records written before it was stored)
+        "latitude": latitude,
+        "longitude": longitude,
+        "geohash": data.get("geohash") or geohash_encode(latitude or 0, longitude or 0),
+        
+        # Sensors
+        "temperature": safe_get(data, "sensors", "temperature"),
+        "humidity": safe_get(data, "sensors", "humidity"),
+        "gas_level": safe_get(data, "sensors", "gas_level"),
+        "flame_detected": safe_get(data, "sensors", "flame_detected", default=False),
+        
+        # Detection
+        "fire_detected": safe_get(data, "detection", "fire_detected", default=False),
+        "smoke_detected": safe_get(data, "detection", "smoke_detected", default=False),
+        "confidence": safe_get(data, "detection", "confidence", default=0),
+        "detections": safe_get(data, "detection", "detections", default=[]),
+        
+        # Analysis
+        "severity": safe_get(data, "analysis", "severity", default="UNKNOWN"),
+        "summary": safe_get(data, "analysis", "summary", default=""),
+        "action": safe_get(data, "analysis", "action", default=""),
+        
+        # Images (previews/thumbnails fall back to full size for older records)
+        "original_url": original_url,
+        "annotated_url": annotated_url,
+        "original_preview_url": safe_get(data, "images", "original_preview_url", default=original_url),
+        "annotated_preview_url": safe_get(data, "images", "annotated_preview_url", default=annotated_url),
+        "annotated_thumbnail_url": safe_get(data, "images", "annotated_thumbnail_url", default=annotated_url),
     }
-@st.cache_data(ttl=10)
-def get_devices():
-    """Get devices from Firebase"""
-    raw_devices = db.reference("devices").get() or {}
+def build_incident_frame(records):
+    """Typed columnar incident table, newest first
+    
+    Severity and status are categorical so dashboard filters and groupbys
+    run as vectorized column operations instead of per-row Python loops.
+    """
+    frame = pd.DataFrame.from_records(records, columns=INCIDENT_COLUMNS)
+    frame["timestamp"] = pd.to_numeric(frame["timestamp"], errors="coerce").fillna(0).astype("int64")
+    for column in ("latitude", "longitude", "confidence"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").fillna(0.0).astype("float64")
+    for column in ("temperature", "humidity", "gas_level"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+    for column in ("flame_detected", "fire_detected", "smoke_detected"):
+        frame[column] = frame[column].eq(True)
+    
+    severity = frame["severity"].astype(str).str.upper()
+    frame["severity"] = pd.Categorical(
+        severity.where(severity.isin(SEVERITY_LEVELS), "UNKNOWN"), categories=SEVERITY_LEVELS
+    )
+    frame["status"] = frame["status"].fillna("unknown").astype(str).astype("category")
+    frame["geohash"] = frame["geohash"].fillna("").astype(str)
+    frame["date"] = pd.to_datetime(frame["timestamp"], unit="ms").dt.date
+    
+    return frame.sort_values("timestamp", ascending=False, kind="stable").reset_index(drop=True)
+def frame_to_records(frame):
+    """Rows of an incident frame as dicts, with missing values as None"""
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+class IncidentCache:
+    """Process-wide incident cache kept current with incremental queries
     
+    The first sync downloads the whole tree; later syncs only fetch records
+    whose updated_at is at or after the newest one already seen (requires
+    ".indexOn": ["updated_at"] on /incidents in the database rules).
+    """
+    def __init__(self, min_interval=5):
+        self.min_interval = min_interval
+        self.records = {}
+        self.cursor = None
+        self.version = 0
+        self.last_sync = 0
+        self._frame = build_incident_frame([])
+        self._frame_version = 0
+        self._lock = threading.RLock()
+    def merge(self, raw_incidents):
+        """Merge raw records into the cache, returns the number that changed"""
+        merged = 0
+        with self._lock:
+            for incident_id, data in (raw_incidents or {}).items():
+                # Skip placeholder and template entries
+                if incident_id.startswith("_") or incident_id.startswith("{") or not isinstance(data, dict):
+                    continue
+                incident = parse_incident(incident_id, data)
+                self.cursor = max(self.cursor or 0, incident["updated_at"] or 0)
+                if self.records.get(incident_id) != incident:
+                    self.records[incident_id] = incident
+                    merged += 1
+            if merged:
+                self.version += 1
+        return merged
+    def remove(self, incident_id):
+        with self._lock:
+            if self.records.pop(incident_id, None) is not None:
+                self.version += 1
+    def replace(self, raw_incidents):
+        """Drop everything and load raw_incidents as the full tree"""
+        with self._lock:
+            self.records = {}
+            self.cursor = None
+            self.version += 1
+            self.merge(raw_incidents)
+    def sync(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self.last_sync < self.min_interval:
+                return
+            ref = db.reference("incidents")
+            if self.cursor is None:
+                self.merge(ref.get())
+            else:
+                self.merge(ref.order_by_child("updated_at").start_at(self.cursor).get())
+            self.last_sync = now
+    def frame(self):
+        """Incidents as a typed frame, newest first (rebuilt only after changes)"""
+        with self._lock:
+            if self._frame_version != self.version:
+                self._frame = build_incident_frame(list(self.records.values()))
+                self._frame_version = self.version
+            return self._frame
+def apply_event(tree, path, data, patch=False):
+    """Apply a listener put/patch event to a nested dict, returns the new root"""
+    if patch:
+        for key, value in (data or {}).items():
+            tree = apply_event(tree, f"{path.rstrip('/')}/{key}", value)
+        return tree
+    keys = [key for key in path.split("/") if key]
+    if not keys:
+        return data if isinstance(data, dict) else {}
+    if not isinstance(tree, dict):
+        tree = {}
+    node = tree
+    for key in keys[:-1]:
+        if not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node[key]
+    if data is None:
+        node.pop(keys[-1], None)
+    else:
+        node[keys[-1]] = data
+    return tree
+def parse_stats(raw_stats):
+    return {**DEFAULT_STATS, **(raw_stats or {})}
+def parse_devices(raw_devices):
     devices = {}
-    for device_id, data in raw_devices.items():
+    for device_id, data in (raw_devices or {}).items():
+        if not isinstance(data, dict):
+            continue
         devices[device_id] = {
             "name": data.get("name", device_id),
             "status": data.get("status", "unknown"),
@@ -97,5 +213,140 @@ def get_devices():
             "solar_charging": data.get("solar_charging"),
             "signal_strength": data.get("signal_strength"),
         }
+    return devices
+def parse_daily_rollups(raw_rollups):
+    """Daily rollup buckets as a frame: date, total and one column per severity"""
+    rows = []
+    for day, bucket in (raw_rollups or {}).items():
+        if not isinstance(bucket, dict):
+            continue
+        severity = bucket.get("severity") or {}
+        row = {"date": day, "total": bucket.get("total", 0)}
+        for level in SEVERITY_LEVELS:
+            row[level] = severity.get(level, 0)
+        rows.append(row)
+    frame = pd.DataFrame(rows, columns=["date", "total"] + SEVERITY_LEVELS)
+    frame["date"] = pd.to_datetime(frame["date"]).dt.date
+    return frame.sort_values("date").reset_index(drop=True)
+class LiveStore:
+    """In-memory copy of incidents, stats, devices and rollups fed by realtime listeners
+    
+    One store (and one set of listener threads) exists per server process;
+    sessions read versioned snapshots instead of polling Firebase. If the
+    listeners cannot be opened it falls back to throttled polling.
+    """
+    POLL_INTERVALS = {"stats": 5, "devices": 10, "rollups/daily": 10}
+    def __init__(self):
+        self.incidents = IncidentCache()
+        self.trees = {"incidents": {}, "stats": {}, "devices": {}, "rollups/daily": {}}
+        self.version = 0
+        self.listening = False
+        self.registrations = []
+        self._last_poll = {}
+        self._snapshot = None
+        self._lock = threading.RLock()
+    def start(self):
+        try:
+            for name in self.trees:
+                self.registrations.append(
+                    db.reference(name).listen(functools.partial(self._on_event, name))
+                )
+            self.listening = True
+        except Exception as e:
+            print(f"Realtime listener error, falling back to polling: {e}")
+            self.stop()
+    def stop(self):
+        for registration in self.registrations:
+            registration.close()
+        self.registrations = []
+        self.listening = False
+    def _on_event(self, name, event):
+        patch = event.event_type == "patch"
+        with self._lock:
+            tree = apply_event(self.trees[name], event.path, event.data, patch)
+            self.trees[name] = tree
+            if name == "incidents":
+                self._refresh_incidents(event.path, event.data, patch)
+            self.version += 1
+    def _refresh_incidents(self, path, data, patch):
+        keys = [key for key in path.split("/") if key]
+        if not keys and not patch:
+            self.incidents.replace(self.trees["incidents"])
+            return
+        if keys:
+            touched = {keys[0]}
+        else:
+            touched = {key.split("/")[0] for key in (data or {})}
+        for incident_id in touched:
+            raw = self.trees["incidents"].get(incident_id)
+            if raw is None:
+                self.incidents.remove(incident_id)
+            else:
+                self.incidents.merge({incident_id: raw})
+    def _poll(self):
+        self.incidents.sync()
+        now = time.monotonic()
+        for name, interval in self.POLL_INTERVALS.items():
+            if now - self._last_poll.get(name, 0) >= interval:
+                with self._lock:
+                    self.trees[name] = db.reference(name).get() or {}
+                    self.version += 1
+                self._last_poll[name] = now
+    def snapshot(self):
+        """Consistent view of incidents, stats, devices and rollups, rebuilt only on change"""
+        if not self.listening:
+            self._poll()
+        with self._lock:
+            version = (self.version, self.incidents.version)
+            if self._snapshot is None or self._snapshot["version"] != version:
+                self._snapshot = {
+                    "version": version,
+                    "incidents": self.incidents.frame(),
+                    "stats": parse_stats(self.trees["stats"]),
+                    "devices": parse_devices(self.trees["devices"]),
+                    "daily_rollups": parse_daily_rollups(self.trees["rollups/daily"]),
+                }
+            return self._snapshot
+@st.cache_resource
+def get_live_store():
+    """Single listener-backed store shared by every session in this server process"""
+    init_firebase()
+    store = LiveStore()
+    store.start()
+    return store
+def get_snapshot():
+    """Versioned snapshot of incidents, stats, devices and rollups for this rerun"""
+    return get_live_store().snapshot()
+def query_incidents(bbox=None, start_ms=None, end_ms=None):
+    """Bounding-box / time-window query answered by the database
     
-    return devices
\ No newline at end of file
+    A bounding box is covered with geohash prefixes, each fetched as an
+    indexed range query on "geohash"; otherwise the time window is an indexed
+    range query on "timestamp". Only matching records are downloaded.
+    """
+    ref = db.reference("incidents")
+    raw = {}
+    if bbox is not None:
+        for cell in bbox_cells(*bbox):
+            raw.update(ref.order_by_child("geohash").start_at(cell).end_at(cell + "\uf8ff").get() or {})
+    else:
+        query = ref.order_by_child("timestamp")
+        if start_ms is not None:
+            query = query.start_at(start_ms)
+        if end_ms is not None:
+            query = query.end_at(end_ms)
+        raw = query.get() or {}
+    rows = [
+        parse_incident(incident_id, data) for incident_id, data in raw.items()
+        if isinstance(data, dict) and not incident_id.startswith(("_", "{"))
+    ]
+    return filter_incidents(build_incident_frame(rows), bbox, start_ms, end_ms)
+def get_incidents():
+    """Incident frame sorted newest first"""
+    return get_snapshot()["incidents"]
+def get_stats():
+    """Get stats from Firebase"""
+    return get_snapshot()["stats"]
+def get_devices():
+    """Get devices from Firebase"""
+    return get_snapshot()["devices"]
@@ -0,0 +1,103 @@
+import pandas as pd
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+SEVERITY_RANK = {"CRITICAL": 4, "HIGH": 3, "MEDIUM": 2, "LOW": 1, "UNKNOWN": 0}
+# Map zoom level -> geohash precision used for clustering (coarser when zoomed out)
+ZOOM_PRECISION = [(14, 7), (11, 6), (9, 5), (6, 4), (4, 3), (0, 2)]
+def geohash_encode(latitude, longitude, precision=9):
+    """Encode a coordinate as a geohash string"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+def geohash_bounds(geohash):
+    """(min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        index = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lng_range if even else lat_range
+            mid = (bounds[0] + bounds[1]) / 2
+            if (index >> shift) & 1:
+                bounds[0] = mid
+            else:
+                bounds[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+def precision_for_zoom(zoom):
+    for min_zoom, precision in ZOOM_PRECISION:
+        if zoom >= min_zoom:
+            return precision
+    return ZOOM_PRECISION[-1][1]
+def bbox_cells(min_lat, min_lng, max_lat, max_lng, max_cells=32):
+    """Geohash prefixes covering a bounding box, as fine as max_cells allows"""
+    for precision in range(7, 0, -1):
+        cell = geohash_bounds(geohash_encode(min_lat, min_lng, precision))
+        lat_step = cell[2] - cell[0]
+        lng_step = cell[3] - cell[1]
+        rows = int((max_lat - min_lat) / lat_step) + 2
+        cols = int((max_lng - min_lng) / lng_step) + 2
+        if rows * cols > max_cells and precision > 1:
+            continue
+        cells = set()
+        for row in range(rows):
+            for col in range(cols):
+                lat = min(min_lat + row * lat_step, max_lat)
+                lng = min(min_lng + col * lng_step, max_lng)
+                cells.add(geohash_encode(lat, lng, precision))
+        return cells
+    return set(GEOHASH_BASE32)
+def filter_incidents(frame, bbox=None, start_ms=None, end_ms=None):
+    """Vectorized bounding-box / time-window filter on an incident frame"""
+    mask = (frame["latitude"] != 0) & (frame["longitude"] != 0)
+    if bbox is not None:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        mask &= frame["latitude"].between(min_lat, max_lat) & frame["longitude"].between(min_lng, max_lng)
+    if start_ms is not None:
+        mask &= frame["timestamp"] >= start_ms
+    if end_ms is not None:
+        mask &= frame["timestamp"] <= end_ms
+    return frame[mask]
+def cluster_incidents(frame, zoom):
+    """Aggregate incidents per geohash cell for the given map zoom
+
+    Returns one row per cell with its incident count, mean position, newest
+    timestamp and worst severity, so the map only draws len(cells) points.
+    """
+    columns = ["cell", "count", "latitude", "longitude", "last_timestamp", "severity"]
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+    precision = precision_for_zoom(zoom)
+    cells = frame.assign(
+        cell=frame["geohash"].str[:precision],
+        severity_rank=frame["severity"].astype(str).map(SEVERITY_RANK).fillna(0)
+    )
+    clusters = cells.groupby("cell", observed=True).agg(
+        count=("id", "size"),
+        latitude=("latitude", "mean"),
+        longitude=("longitude", "mean"),
+        last_timestamp=("timestamp", "max"),
+        severity_rank=("severity_rank", "max"),
+    ).reset_index()
+    rank_to_severity = {rank: severity for severity, rank in SEVERITY_RANK.items()}
+    clusters["severity"] = clusters["severity_rank"].map(rank_to_severity)
+    return clusters[columns]